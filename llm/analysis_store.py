@@ -0,0 +1,96 @@
+import json
+import sqlite3
+from pathlib import Path
+
+
+class AnalysisStore:
+    """SQLite-backed cache of analysis results keyed by ``file:function:line``.
+
+    Every write is committed immediately, so results survive a crashed run.
+    Entries are read on demand instead of loading the whole cache, and WAL
+    mode lets other processes read while a run is writing. A secondary index
+    on (content hash, prompt/model fingerprint, origin) finds results for
+    functions that moved to another line or file; the origin hint is part of
+    the prompt, so identical bodies of kernel and user code do not share.
+    """
+
+    def __init__(self, path, legacy_json=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fresh = not self.path.exists()
+        self.conn = sqlite3.connect(str(self.path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, content_hash TEXT, data TEXT NOT NULL, fingerprint TEXT, origin TEXT)"
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(results)")}
+        if "fingerprint" not in columns:
+            self.conn.execute("ALTER TABLE results ADD COLUMN fingerprint TEXT")
+        if "origin" not in columns:
+            # Older rows keep a NULL origin and are only reachable by key
+            self.conn.execute("ALTER TABLE results ADD COLUMN origin TEXT")
+        self.conn.execute("DROP INDEX IF EXISTS results_by_content")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS results_by_content_origin ON results (content_hash, fingerprint, origin)"
+        )
+        self.conn.commit()
+        if fresh and legacy_json is not None and Path(legacy_json).exists():
+            self.migrate_json(legacy_json)
+
+    def migrate_json(self, json_path):
+        """Import a legacy ``function_analysis_store.json``; returns the row count."""
+        try:
+            data = json.loads(Path(json_path).read_text(encoding="utf-8"))
+        except Exception:
+            return 0
+        rows = [
+            (key, value.get("content_hash"), json.dumps(value, ensure_ascii=False))
+            for key, value in data.items()
+            if isinstance(value, dict)
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO results (key, content_hash, data) VALUES (?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def get(self, key, default=None):
+        row = self.conn.execute("SELECT data FROM results WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def find_by_content(self, content_hash, fingerprint, origin):
+        """Return any result for an identical body analyzed with the same prompt/model and origin."""
+        if not content_hash or not fingerprint:
+            return None
+        row = self.conn.execute(
+            "SELECT data FROM results WHERE content_hash = ? AND fingerprint = ? AND origin = ? LIMIT 1",
+            (content_hash, fingerprint, origin),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value, fingerprint=None, origin=None):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (key, content_hash, data, fingerprint, origin) VALUES (?, ?, ?, ?, ?)",
+            (key, value.get("content_hash"), json.dumps(value, ensure_ascii=False), fingerprint, origin),
+        )
+        self.conn.commit()
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def __contains__(self, key):
+        return self.conn.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -3,8 +3,15 @@ import json
 import asyncio
 import argparse
 import re
+import hashlib
 from pathlib import Path
 from openai import OpenAI, AsyncOpenAI
+try:
+    from llm.scheduler import Scheduler, estimate_tokens
+    from llm.clients import make_client, make_async_client
+except ImportError:
+    from scheduler import Scheduler, estimate_tokens
+    from clients import make_client, make_async_client
 try:
     import platform
     if platform.system().lower().startswith("win"):
@@ -40,6 +47,85 @@ def classify_origin(file_path: str):
         return "user"
     return "unknown"
 
+PROMPT_RULES = (
+    "1) Only list direct, reachable calls within the function body; exclude self-calls. "
+    "2) For each call, provide its entry condition as the expression INSIDE the if parentheses (no 'if' and no outer parentheses). Use 'unconditional' if always executed. "
+    "3) When an early-return guard like 'if (len == 0) return 0;' precedes a call, the call's condition is the logical negation expression (e.g., 'len != 0'). "
+    "4) Prefer concise expressions; avoid redundant text. "
+)
+
+# Comments, string/char literals and runs of blanks; literals are matched so
+# that comment markers and spaces inside strings are left alone
+_TRIM_RE = re.compile(
+    r'/\*.*?\*/|//[^\n]*|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|[ \t]+',
+    re.S,
+)
+TRIM_CONTENT = os.getenv("TRIM_CONTENT", "") not in ("", "0")
+PROMPT_STATS = {"requests": 0, "prompt_tokens": 0, "prefix_tokens": 0, "content_tokens": 0, "trimmed_tokens": 0}
+
+def trim_content(content: str) -> str:
+    # Drop comments, collapse runs of blanks and remove indentation and empty
+    # lines; the code itself is unchanged
+    def repl(m):
+        t = m.group()
+        if t[0] in "\"'":
+            return t
+        return "" if t.startswith("//") else " "
+    lines = (ln.strip() for ln in _TRIM_RE.sub(repl, content).splitlines())
+    return "\n".join(ln for ln in lines if ln)
+
+def prompt_content(content: str) -> str:
+    if not TRIM_CONTENT:
+        return content
+    trimmed = trim_content(content)
+    if content:
+        PROMPT_STATS["content_tokens"] += estimate_tokens(content)
+        PROMPT_STATS["trimmed_tokens"] += estimate_tokens(trimmed)
+    return trimmed
+
+def prompt_tokens(sys: str, usr: str) -> int:
+    # Estimated request size; also tallies how much of it is the shared prefix
+    tokens = estimate_tokens(sys, usr)
+    PROMPT_STATS["requests"] += 1
+    PROMPT_STATS["prompt_tokens"] += tokens
+    PROMPT_STATS["prefix_tokens"] += estimate_tokens(sys)
+    return tokens
+
+def format_prompt_stats(stats=PROMPT_STATS):
+    if not stats["requests"]:
+        return None
+    line = (
+        f"Prompts: {stats['requests']} requests, ~{stats['prompt_tokens']} tokens, "
+        f"~{stats['prefix_tokens']} in the shared prefix"
+    )
+    if stats["content_tokens"]:
+        saved = stats["content_tokens"] - stats["trimmed_tokens"]
+        line += f"; trimming saved ~{saved} tokens ({saved * 100 // stats['content_tokens']}% of function bodies)"
+    return line
+
+def _system_prompt(batch: bool):
+    # Everything that is the same for every request goes here, ahead of the
+    # function-specific text, so providers can reuse the cached prompt prefix
+    if batch:
+        shape = (
+            'a single JSON object of the form {"results": [...]} with one entry per function, '
+            "each entry having keys: "
+        )
+        task = (
+            "Analyze each C function given by the user and produce strictly valid JSON. "
+            "Copy function_name and line_number exactly as given. Requirements for every function: "
+        )
+    else:
+        shape = "a single JSON object with keys: "
+        task = "Analyze the C function given by the user and produce strictly valid JSON. Requirements: "
+    trimmed = "Comments and indentation have been removed from function content. " if TRIM_CONTENT else ""
+    return (
+        "You are a strict JSON generator. Return only " + shape
+        + ",".join(SCHEMA_KEYS)
+        + ". Do not include any markdown or explanations outside JSON. "
+        + task + PROMPT_RULES + trimmed
+    )
+
 def build_prompt(item):
     origin_hint = classify_origin(item["file"])
     content = item["content"]
@@ -57,22 +143,77 @@ def build_prompt(item):
         "confidence": 0.0,
         "notes": ""
     }
-    sys = (
-        "You are a strict JSON generator. Return only a single JSON object with keys: "
-        + ",".join(SCHEMA_KEYS)
-        + ". Do not include any markdown or explanations outside JSON."
-    )
+    sys = _system_prompt(batch=False)
     usr = (
-        "Analyze the following C function and produce strictly valid JSON. Requirements: "
-        "1) Only list direct, reachable calls within the function body; exclude self-calls. "
-        "2) For each call, provide its entry condition as the expression INSIDE the if parentheses (no 'if' and no outer parentheses). Use 'unconditional' if always executed. "
-        "3) When an early-return guard like 'if (len == 0) return 0;' precedes a call, the call's condition is the logical negation expression (e.g., 'len != 0'). "
-        "4) Prefer concise expressions; avoid redundant text. "
         f"Origin hint: {origin_hint}. File: {file_path}. Name: {name}. Line: {line}. "
-        "Function content begins:\n" + content + "\nFunction content ends."
+        "Function content begins:\n" + prompt_content(content) + "\nFunction content ends."
     )
     return sys, usr, schema
 
+def build_batch_prompt(items):
+    # Several functions from one file in a single request; the reply is an
+    # object whose "results" array has one entry per function
+    file_path = items[0]["file"].replace("\\", "/")
+    origin_hint = classify_origin(items[0]["file"])
+    sys = _system_prompt(batch=True)
+    parts = [f"Functions: {len(items)}. Origin hint: {origin_hint}. File: {file_path}."]
+    for it in items:
+        parts.append(
+            f"Name: {it['function']}. Line: {it['line']}. "
+            "Function content begins:\n" + prompt_content(it["content"]) + "\nFunction content ends."
+        )
+    return sys, "\n\n".join(parts)
+
+def split_batch_reply(items, txt):
+    # Returns one model_json per item, or None where the reply has no usable entry
+    out = [None] * len(items)
+    try:
+        obj = json.loads(txt)
+    except Exception:
+        return out
+    entries = obj.get("results") if isinstance(obj, dict) else obj
+    if not isinstance(entries, list):
+        return out
+    by_loc = {}
+    by_name = {}
+    for e in entries:
+        if not isinstance(e, dict) or not isinstance(e.get("calls", []), list):
+            continue
+        name = e.get("function_name")
+        by_loc[(name, str(e.get("line_number")))] = e
+        by_name.setdefault(name, []).append(e)
+    for k, it in enumerate(items):
+        e = by_loc.get((it["function"], str(it["line"])))
+        if e is None and len(by_name.get(it["function"], [])) == 1:
+            e = by_name[it["function"]][0]
+        out[k] = e
+    return out
+
+def pack_batches(entries, token_budget: int, max_items: int = 16):
+    # Groups consecutive (index, item) pairs from the same file into lists
+    # whose estimated content size stays within token_budget
+    batch = []
+    used = 0
+    for entry in entries:
+        it = entry[1]
+        cost = estimate_tokens(it["content"])
+        if batch and (it["file"] != batch[0][1]["file"] or used + cost > token_budget or len(batch) >= max_items):
+            yield batch
+            batch = []
+            used = 0
+        batch.append(entry)
+        used += cost
+    if batch:
+        yield batch
+
+def prompt_fingerprint():
+    # Identifies the prompt template and model; cached LLM output is only
+    # reused for other locations when both are unchanged.
+    probe = {"file": "probe/probe.c", "function": "probe", "line": 1, "content": ""}
+    sys, usr, _ = build_prompt(probe)
+    raw = "\0".join([str(MODEL), str(TRIM_CONTENT), sys, usr])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
 def merge_result(item, model_json):
     out = {
         "file_path": item["file"].replace("\\", "/"),
@@ -87,102 +228,114 @@ def merge_result(item, model_json):
     }
     return out
 
-def extract_calls_with_conditions(content: str, function_name: str = None):
-    lines = content.splitlines()
-    call_re = re.compile(r"([A-Za-z_]\w*)\s*\(")
-    keywords = {"if", "for", "while", "switch", "return", "sizeof"}
-
-    def invert_condition(expr: str) -> str:
-        s = expr.strip()
-        pairs = [("==", "!="), ("!=", "=="), ("<=", ">") , (">=", "<"), ("<", ">="), (">", "<=")]
-        for a, b in pairs:
-            if a in s:
-                return s.replace(a, b)
-        if s.startswith("!"):
-            return s[1:].strip()
-        return "!(" + s + ")"
-
-    def extract_if_condition(start_line: int):
-        for j in range(start_line, -1, -1):
-            s = lines[j]
-            m = re.search(r"\bif\s*\(", s)
-            if not m:
-                continue
-            found_close = False
-            depth = 1
-            buf = []
-            rest = s[m.end():]
-            for ch in rest:
-                if ch == '(':
-                    depth += 1
-                elif ch == ')':
-                    depth -= 1
-                    if depth == 0:
-                        found_close = True
-                        break
-                buf.append(ch)
-            end_line = j
-            if not found_close:
-                for k in range(j + 1, min(len(lines), start_line + 1)):
-                    for ch in lines[k]:
-                        if ch == '(':
-                            depth += 1
-                        elif ch == ')':
-                            depth -= 1
-                            if depth == 0:
-                                end_line = k
-                                found_close = True
-                                break
-                        buf.append(ch)
-                    if found_close:
-                        break
-            if not found_close:
-                continue
-            cond_inner = ''.join(buf).strip()
-            if not found_close:
-                continue
-            brace_depth = 0
-            inside_if = False
-            for t in range(j, start_line + 1):
-                brace_depth += lines[t].count("{")
-                brace_depth -= lines[t].count("}")
-                if t == start_line:
-                    inside_if = brace_depth > 0
-            block_has_brace = any("{" in lines[t] for t in range(j, min(len(lines), end_line + 1)))
-            early_return = False
-            if not block_has_brace:
-                tail = lines[j][m.end():]
-                if re.search(r"\b(return|goto|break|continue)\b", tail):
-                    early_return = True
-                else:
-                    if j + 1 <= start_line:
-                        nxt = lines[j + 1]
-                        if re.search(r"\b(return|goto|break|continue)\b", nxt):
-                            early_return = True
-            return cond_inner, inside_if, early_return
-        return None, False, False
+CALL_RE = re.compile(r"([A-Za-z_]\w*)\s*\(")
+IF_RE = re.compile(r"\bif\s*\(")
+JUMP_RE = re.compile(r"\b(return|goto|break|continue)\b")
+CALL_KEYWORDS = {"if", "for", "while", "switch", "return", "sizeof"}
+
+def invert_condition(expr: str) -> str:
+    s = expr.strip()
+    pairs = [("==", "!="), ("!=", "=="), ("<=", ">") , (">=", "<"), ("<", ">="), (">", "<=")]
+    for a, b in pairs:
+        if a in s:
+            return s.replace(a, b)
+    if s.startswith("!"):
+        return s[1:].strip()
+    return "!(" + s + ")"
 
+def _feed_condition(guard, text):
+    # Consume characters of an if-condition until its parentheses balance
+    depth = guard["paren"]
+    buf = guard["buf"]
+    for ch in text:
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+            if depth == 0:
+                guard["paren"] = 0
+                return True
+        buf.append(ch)
+    guard["paren"] = depth
+    return False
+
+def extract_calls_with_conditions(content: str, function_name: str = None, macros: dict = None):
+    # Single forward pass. Each call takes its condition from the nearest
+    # preceding `if` whose condition has closed: the call is inside that if
+    # when the brace balance since the if line is positive, or behind an
+    # early-return guard when the if has no braces and jumps away.
+    # Without a preprocessor, upper-case names are taken to be macros and
+    # skipped; with ``macros`` (macro -> functions its expansion calls, from
+    # scripts/preprocess.py) known macros stand for those functions and every
+    # other name is a call, whatever its case.
+    lines = content.splitlines()
+    guards = []   # every if-statement seen so far, in line order
+    pending = []  # guards whose condition is still being read
+    depth = 0     # brace balance before the current line
     calls = []
     for idx, line in enumerate(lines):
-        for m in call_re.finditer(line):
+        if guards and guards[-1]["line"] == idx - 1:
+            guards[-1]["next_jump"] = bool(JUMP_RE.search(line))
+        if pending:
+            still_open = []
+            for g in pending:
+                g["has_brace"] = g["has_brace"] or "{" in line
+                if _feed_condition(g, line):
+                    g["closed"] = True
+                else:
+                    still_open.append(g)
+            pending = still_open
+        m = IF_RE.search(line)
+        if m:
+            tail = line[m.end():]
+            g = {
+                "line": idx,
+                "depth": depth,
+                "paren": 1,
+                "buf": [],
+                "closed": False,
+                "has_brace": "{" in line,
+                "tail_jump": bool(JUMP_RE.search(tail)),
+                "next_jump": False,
+            }
+            guards.append(g)
+            if _feed_condition(g, tail):
+                g["closed"] = True
+            else:
+                pending.append(g)
+        depth_after = depth + line.count("{") - line.count("}")
+        guard = None
+        for m in CALL_RE.finditer(line):
             callee = m.group(1)
-            if callee in keywords:
-                continue
-            if callee.isupper():
+            if callee in CALL_KEYWORDS:
                 continue
-            if function_name and callee == function_name:
+            if macros is None:
+                if callee.isupper():
+                    continue
+                names = (callee,)
+            else:
+                names = macros.get(callee, (callee,))
+            names = [n for n in names if not (function_name and n == function_name)]
+            if not names:
                 continue
-            cond = "unconditional"
-            cond_inner, inside_if, early_return = extract_if_condition(idx)
-            if cond_inner is not None:
-                if inside_if:
-                    cond = cond_inner
-                elif early_return:
-                    inv = invert_condition(cond_inner)
-                    cond = inv
+            if guard is None:
+                # Unclosed conditions (a call inside a multi-line condition)
+                # are skipped; there are only ever a few of them at the tail.
+                for k in range(len(guards) - 1, -1, -1):
+                    if guards[k]["closed"]:
+                        guard = guards[k]
+                        break
                 else:
-                    cond = "unconditional"
-            calls.append({"callee": callee, "condition": cond})
+                    guard = False
+            cond = "unconditional"
+            if guard:
+                if depth_after - guard["depth"] > 0:
+                    cond = ''.join(guard["buf"]).strip()
+                elif not guard["has_brace"] and (guard["tail_jump"] or (guard["line"] < idx and guard["next_jump"])):
+                    cond = invert_condition(''.join(guard["buf"]).strip())
+            for n in names:
+                calls.append({"callee": n, "condition": cond})
+        depth = depth_after
     unique = []
     seen = set()
     for c in calls:
@@ -194,11 +347,29 @@ def extract_calls_with_conditions(content: str, function_name: str = None):
             unique.append(c)
     return unique
 
+BRANCH_RE = re.compile(r"\b(?:if|for|while|switch|case)\b|\?|&&|\|\|")
+IDENT_RE = re.compile(r"\b[A-Za-z_]\w*\b")
+
+def complexity_score(item, calls=None) -> float:
+    # How much an LLM is likely to add over the static pass: branches and
+    # conditional calls weigh most, then call count, length and macro density
+    # (macros hide control flow the static pass cannot see)
+    content = item["content"]
+    if calls is None:
+        calls = extract_calls_with_conditions(content, item["function"], item.get("macros"))
+    branches = len(BRANCH_RE.findall(content))
+    conditional = sum(1 for c in calls if c["condition"] != "unconditional")
+    idents = IDENT_RE.findall(content)
+    macros = sum(1 for t in idents if t.isupper() and len(t) > 1)
+    macro_density = macros / len(idents) if idents else 0.0
+    lines = content.count("\n") + 1
+    return 2.0 * branches + conditional + 0.5 * len(calls) + lines / 20.0 + 10.0 * macro_density
+
 def static_analyze(item):
     content = item["content"]
     name = item["function"]
     origin = classify_origin(item["file"])
-    calls = extract_calls_with_conditions(content, name)
+    calls = extract_calls_with_conditions(content, name, item.get("macros"))
     has_write = "write(" in content
     has_read = "read(" in content
     has_ctu = "copy_to_user(" in content
@@ -233,15 +404,18 @@ def static_analyze(item):
     conf = min(0.9, base_conf + 0.1 * enrich + 0.1 * (1 if calls else 0))
     return {"origin": origin, "summary": summary, "calls": calls, "confidence": conf, "notes": "fallback_static_analysis"}
 
-def analyze_sync(client: OpenAI, item):
+def analyze_sync(client: OpenAI, item, scheduler=None):
     sys, usr, schema = build_prompt(item)
+    tokens = prompt_tokens(sys, usr)
     try:
-        resp = client.chat.completions.create(
-            model=MODEL,
-            messages=[{"role": "system", "content": sys}, {"role": "user", "content": usr}],
-            temperature=0,
-            response_format={"type": "json_object"},
-        )
+        def request():
+            return client.chat.completions.create(
+                model=MODEL,
+                messages=[{"role": "system", "content": sys}, {"role": "user", "content": usr}],
+                temperature=0,
+                response_format={"type": "json_object"},
+            )
+        resp = scheduler.call(request, tokens) if scheduler else request()
         txt = resp.choices[0].message.content.strip()
         model_json = json.loads(txt)
     except Exception as e:
@@ -250,16 +424,19 @@ def analyze_sync(client: OpenAI, item):
         model_json = sa
     return merge_result(item, model_json)
 
-async def analyze_async(client: AsyncOpenAI, item, sem: asyncio.Semaphore):
+async def analyze_async(client: AsyncOpenAI, item, sem: asyncio.Semaphore, scheduler=None):
     sys, usr, schema = build_prompt(item)
+    tokens = prompt_tokens(sys, usr)
     async with sem:
         try:
-            resp = await client.chat.completions.create(
-                model=MODEL,
-                messages=[{"role": "system", "content": sys}, {"role": "user", "content": usr}],
-                temperature=0,
-                response_format={"type": "json_object"},
-            )
+            def request():
+                return client.chat.completions.create(
+                    model=MODEL,
+                    messages=[{"role": "system", "content": sys}, {"role": "user", "content": usr}],
+                    temperature=0,
+                    response_format={"type": "json_object"},
+                )
+            resp = await (scheduler.acall(request, tokens) if scheduler else request())
             txt = resp.choices[0].message.content.strip()
             model_json = json.loads(txt)
         except Exception as e:
@@ -268,6 +445,51 @@ async def analyze_async(client: AsyncOpenAI, item, sem: asyncio.Semaphore):
             model_json = sa
         return merge_result(item, model_json)
 
+def _batch_request(client, items):
+    sys, usr = build_batch_prompt(items)
+    def request():
+        return client.chat.completions.create(
+            model=MODEL,
+            messages=[{"role": "system", "content": sys}, {"role": "user", "content": usr}],
+            temperature=0,
+            response_format={"type": "json_object"},
+        )
+    return request, prompt_tokens(sys, usr)
+
+def _batch_failed(items, e):
+    out = []
+    for it in items:
+        sa = static_analyze(it)
+        sa["notes"] = f"llm_call_failed: {type(e).__name__}: {str(e)}; " + sa["notes"]
+        out.append(merge_result(it, sa))
+    return out
+
+def analyze_batch_sync(client: OpenAI, items, scheduler=None):
+    """Analyze several functions in one request; unparsable entries are retried alone."""
+    request, tokens = _batch_request(client, items)
+    try:
+        resp = scheduler.call(request, tokens) if scheduler else request()
+        txt = resp.choices[0].message.content.strip()
+    except Exception as e:
+        return _batch_failed(items, e)
+    parsed = split_batch_reply(items, txt)
+    return [merge_result(it, mj) if mj is not None else analyze_sync(client, it, scheduler)
+            for it, mj in zip(items, parsed)]
+
+async def analyze_batch_async(client: AsyncOpenAI, items, sem: asyncio.Semaphore, scheduler=None):
+    request, tokens = _batch_request(client, items)
+    async with sem:
+        try:
+            resp = await (scheduler.acall(request, tokens) if scheduler else request())
+            txt = resp.choices[0].message.content.strip()
+        except Exception as e:
+            return _batch_failed(items, e)
+    parsed = split_batch_reply(items, txt)
+    out = []
+    for it, mj in zip(items, parsed):
+        out.append(merge_result(it, mj) if mj is not None else await analyze_async(client, it, sem, scheduler))
+    return out
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--async", dest="use_async", action="store_true")
@@ -281,14 +503,19 @@ def main():
         results = [merge_result(it, static_analyze(it)) for it in items]
     elif args.use_async:
         async def run():
-            aclient = AsyncOpenAI(base_url=BASE_URL, api_key=API_KEY)
+            aclient = make_async_client(BASE_URL, API_KEY, args.max_concurrency)
             sem = asyncio.Semaphore(max(1, args.max_concurrency))
-            tasks = [analyze_async(aclient, it, sem) for it in items]
-            return await asyncio.gather(*tasks)
+            scheduler = Scheduler()
+            tasks = [analyze_async(aclient, it, sem, scheduler) for it in items]
+            try:
+                return await asyncio.gather(*tasks)
+            finally:
+                await aclient.close()
         results = asyncio.run(run())
     else:
-        client = OpenAI(base_url=BASE_URL, api_key=API_KEY)
-        results = [analyze_sync(client, it) for it in items]
+        with make_client(BASE_URL, API_KEY) as client:
+            scheduler = Scheduler()
+            results = [analyze_sync(client, it, scheduler) for it in items]
     out_path = Path(args.output)
     out_path.parent.mkdir(parents=True, exist_ok=True)
     out_path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
@@ -0,0 +1,96 @@
+from collections import defaultdict, deque
+
+try:
+    from llm.analyze_functions import extract_calls_with_conditions
+except ImportError:
+    from analyze_functions import extract_calls_with_conditions
+
+ORDERS = ("scan", "centrality", "fanin", "entry")
+
+
+def build_call_graph(items, symbols=None):
+    # Static call graph over item indices; a call to a name links to every
+    # definition with that name, or with symbols (scripts/symbol_table.py)
+    # to the definitions the caller's translation unit can reach
+    by_name = defaultdict(list)
+    by_def = defaultdict(list)
+    for i, it in enumerate(items):
+        by_name[it["function"]].append(i)
+        by_def[(it["file"].replace("\\", "/"), it["function"])].append(i)
+    callees = [set() for _ in items]
+    for i, it in enumerate(items):
+        for c in extract_calls_with_conditions(it["content"], it["function"], it.get("macros")):
+            targets = by_name.get(c["callee"], ())
+            if targets and symbols is not None:
+                files = symbols.resolve(it["file"], c["callee"])
+                if files is not None:
+                    targets = [j for f in files for j in by_def.get((f, c["callee"]), ())]
+            for j in targets:
+                if j != i:
+                    callees[i].add(j)
+    return callees
+
+
+def fan_in(callees):
+    counts = [0] * len(callees)
+    for out in callees:
+        for j in out:
+            counts[j] += 1
+    return counts
+
+
+def centrality(callees, iterations: int = 20, damping: float = 0.85):
+    # PageRank over call edges: a function ranks high when many (important)
+    # functions call it; leaf functions spread their rank evenly
+    n = len(callees)
+    if not n:
+        return []
+    rank = [1.0 / n] * n
+    for _ in range(iterations):
+        nxt = [(1.0 - damping) / n] * n
+        dangling = 0.0
+        for i, out in enumerate(callees):
+            if out:
+                share = damping * rank[i] / len(out)
+                for j in out:
+                    nxt[j] += share
+            else:
+                dangling += damping * rank[i]
+        spread = dangling / n
+        rank = [r + spread for r in nxt]
+    return rank
+
+
+def entry_depth(callees, fan_ins):
+    # Call depth from the nearest entry point (a function nobody calls);
+    # functions only reachable through cycles come last
+    depth = [None] * len(callees)
+    queue = deque(i for i, f in enumerate(fan_ins) if f == 0)
+    for i in queue:
+        depth[i] = 0
+    while queue:
+        i = queue.popleft()
+        for j in callees[i]:
+            if depth[j] is None:
+                depth[j] = depth[i] + 1
+                queue.append(j)
+    return [d if d is not None else len(callees) for d in depth]
+
+
+def priority_order(items, order: str = "centrality", symbols=None):
+    """Indices of ``items``, most important first; ties keep scan order."""
+    if order not in ORDERS:
+        raise ValueError(f"Unknown order: {order}")
+    if order == "scan":
+        return list(range(len(items)))
+    callees = build_call_graph(items, symbols)
+    fan_ins = fan_in(callees)
+    if order == "fanin":
+        key = lambda i: (-fan_ins[i], i)
+    elif order == "entry":
+        depth = entry_depth(callees, fan_ins)
+        key = lambda i: (depth[i], -fan_ins[i], i)
+    else:
+        rank = centrality(callees)
+        key = lambda i: (-rank[i], -fan_ins[i], i)
+    return sorted(range(len(items)), key=key)
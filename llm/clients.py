@@ -0,0 +1,61 @@
+import importlib
+import sys
+
+import openai
+from openai import OpenAI, AsyncOpenAI
+
+# Newer openai releases are built on httpx2 (same API as httpx); custom
+# http clients have to come from whichever module the package uses.
+try:
+    httpx = importlib.import_module("httpx2" if hasattr(openai, "DefaultHttpx2Client") else "httpx")
+except ImportError:
+    httpx = None
+
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_KEEPALIVE = 30.0
+_H2_WARNED = []
+
+
+def _http_client(cls_name: str, max_concurrency: int, http2: bool, timeout: float, connect_timeout: float,
+                 keepalive_expiry: float):
+    # One keep-alive connection per concurrent request, kept open between
+    # requests so each call skips TCP/TLS setup
+    pool = max(1, max_concurrency)
+    kwargs = dict(
+        limits=httpx.Limits(max_connections=pool, max_keepalive_connections=pool,
+                            keepalive_expiry=keepalive_expiry),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+    )
+    cls = getattr(httpx, cls_name)
+    if http2:
+        try:
+            return cls(http2=True, **kwargs)
+        except ImportError:
+            if not _H2_WARNED:
+                _H2_WARNED.append(True)
+                print("HTTP/2 needs the 'h2' package; falling back to HTTP/1.1", file=sys.stderr)
+    return cls(**kwargs)
+
+
+def make_client(base_url=None, api_key=None, max_concurrency: int = 1, http2: bool = False,
+                timeout: float = DEFAULT_TIMEOUT, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                keepalive_expiry: float = DEFAULT_KEEPALIVE, max_retries: int = 0) -> OpenAI:
+    """Synchronous client with a pooled keep-alive transport.
+
+    Retries default to 0 because ``llm.scheduler.Scheduler`` handles them.
+    """
+    if httpx is None:
+        return OpenAI(base_url=base_url, api_key=api_key, max_retries=max_retries, timeout=timeout)
+    http_client = _http_client("Client", max_concurrency, http2, timeout, connect_timeout, keepalive_expiry)
+    return OpenAI(base_url=base_url, api_key=api_key, max_retries=max_retries, http_client=http_client)
+
+
+def make_async_client(base_url=None, api_key=None, max_concurrency: int = 5, http2: bool = False,
+                      timeout: float = DEFAULT_TIMEOUT, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                      keepalive_expiry: float = DEFAULT_KEEPALIVE, max_retries: int = 0) -> AsyncOpenAI:
+    """Asynchronous counterpart of :func:`make_client`; size the pool to the concurrency limit."""
+    if httpx is None:
+        return AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=max_retries, timeout=timeout)
+    http_client = _http_client("AsyncClient", max_concurrency, http2, timeout, connect_timeout, keepalive_expiry)
+    return AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=max_retries, http_client=http_client)
@@ -0,0 +1,121 @@
+import asyncio
+import random
+import time
+
+# Status codes worth retrying: timeouts, conflicts, rate limits, server errors
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRY_ERRORS = ("APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError")
+
+
+def estimate_tokens(*texts) -> int:
+    # Rough prompt size (~4 characters per token), enough for budgeting
+    return sum(len(t) for t in texts) // 4 + 1
+
+
+def is_retryable(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRY_STATUS
+    return any(cls.__name__ in RETRY_ERRORS for cls in type(exc).__mro__) or isinstance(exc, TimeoutError)
+
+
+def retry_after(exc: Exception):
+    """Seconds requested by the server via Retry-After(-ms), or None."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms is not None:
+            return max(0.0, float(ms) / 1000.0)
+        sec = headers.get("retry-after")
+        if sec is not None:
+            return max(0.0, float(sec))
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+class _Bucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.stamp = None
+
+    def reserve(self, amount: float, now: float) -> float:
+        # Book `amount` now (the level may go negative) and return the wait
+        # before the booked capacity is actually available
+        if self.stamp is not None:
+            self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+        self.level -= amount
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+
+class Scheduler:
+    """Rate limiting and retries for LLM calls.
+
+    Requests are paced by optional requests/sec and tokens/min budgets.
+    Transient failures (429, 5xx, timeouts, connection errors) are retried
+    with exponential backoff and full jitter, honouring Retry-After, up to
+    ``max_retries`` times; the last error is then re-raised.
+    """
+
+    def __init__(self, requests_per_sec=None, tokens_per_min=None, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0, clock=time.monotonic):
+        self.requests = _Bucket(requests_per_sec, max(1.0, requests_per_sec)) if requests_per_sec else None
+        self.tokens = _Bucket(tokens_per_min / 60.0, tokens_per_min) if tokens_per_min else None
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.stats = {"calls": 0, "retries": 0, "throttled_s": 0.0}
+
+    def reserve(self, tokens: int = 0) -> float:
+        now = self.clock()
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1, now))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.reserve(tokens, now))
+        self.stats["throttled_s"] += wait
+        return wait
+
+    def backoff(self, attempt: int, exc: Exception) -> float:
+        hinted = retry_after(exc)
+        if hinted is not None:
+            return hinted
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn, tokens: int = 0):
+        attempt = 0
+        while True:
+            wait = self.reserve(tokens)
+            if wait > 0:
+                time.sleep(wait)
+            self.stats["calls"] += 1
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                self.stats["retries"] += 1
+                time.sleep(self.backoff(attempt, e))
+                attempt += 1
+
+    async def acall(self, fn, tokens: int = 0):
+        attempt = 0
+        while True:
+            wait = self.reserve(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.stats["calls"] += 1
+            try:
+                return await fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.backoff(attempt, e))
+                attempt += 1
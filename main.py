@@ -2,45 +2,468 @@ import argparse
 import json
 import asyncio
 import hashlib
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain
 from pathlib import Path
 
-from scripts.scan_c_functions import extract_functions_from_text
+from scripts.preprocess import Preprocessor
+from scripts.scan_c_functions import extract_symbols
+from scripts.symbol_table import SymbolTable
 from llm import analyze_functions as af
+from llm.analysis_store import AnalysisStore
+from llm.scheduler import Scheduler
+from llm.call_graph import ORDERS, priority_order
+from llm.clients import make_client, make_async_client
 from visualization.generate_report import generate_report
 
 
-def scan_functions(root: Path, target: Path):
-    items = []
-    for p in target.rglob('*.c'):
+SCAN_INDEX_VERSION = 4
+
+
+def decode_source(data: bytes) -> str:
+    return data.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def scan_file(root: Path, p: Path, prev_hash: str = None, pp: Preprocessor = None):
+    # Returns (entry, text): a scan index entry and the file's text with
+    # normalized line endings. Entry functions are [name, line, start, end],
+    # with text[start:end] the body, so the index never holds bodies;
+    # "functions" is None when the content hash matches prev_hash, so the
+    # caller can keep the previously extracted list. "symbols" feeds the
+    # symbol table; headers contribute no functions.
+    # With a preprocessor, .c files are scanned after conditional blocks and
+    # file-scope macros are resolved; each function gets a fifth element
+    # mapping the macros it calls to the functions they expand to, and the
+    # entry records the configuration ("pp") and the headers read ("deps").
+    try:
+        st = p.stat()
+        data = p.read_bytes()
+    except Exception:
+        return None
+    h = hashlib.sha1(data).hexdigest()[:16]
+    t = decode_source(data)
+    entry = {"mtime": st.st_mtime_ns, "size": st.st_size, "hash": h, "functions": None, "symbols": None}
+    if pp is not None:
+        entry["pp"] = pp.fingerprint()
+        entry["deps"] = {}
+    if h != prev_hash:
+        if p.suffix == '.h':
+            _, entry["symbols"] = extract_symbols(t)
+            entry["functions"] = []
+        elif pp is None:
+            functions, entry["symbols"] = extract_symbols(t)
+            entry["functions"] = [list(f) for f in functions]
+        else:
+            result = pp.run(t, p)
+            functions, entry["symbols"] = extract_symbols(result.text, t)
+            entry["functions"] = [[name, line, start, end, pp.invoked_macros(t[start:end], result.macros)]
+                                  for name, line, start, end in functions]
+            entry["deps"] = result.deps
+    return entry, t
+
+
+def pp_current(entry: dict, pp: Preprocessor, stat_cache: dict) -> bool:
+    # A preprocessed entry is only valid for the same -I/-D configuration and
+    # while every header it read keeps its mtime and size
+    if entry.get("pp") != (pp.fingerprint() if pp is not None else None):
+        return False
+    for path, stat in (entry.get("deps") or {}).items():
+        if path not in stat_cache:
+            try:
+                st = os.stat(path)
+                stat_cache[path] = [st.st_mtime_ns, st.st_size]
+            except OSError:
+                stat_cache[path] = None
+        if stat_cache[path] != stat:
+            return False
+    return True
+
+
+def bounded_map(ex, fn, *iterables, window: int):
+    # Executor.map in submission order, but with at most window calls ahead
+    # of the consumer: a paused consumer stops new submissions
+    pending = deque()
+    for args in zip(*iterables):
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(ex.submit(fn, *args))
+    while pending:
+        yield pending.popleft().result()
+
+
+def iter_scan(root: Path, target: Path, jobs: int = 1, index: dict = None, stats: dict = None,
+              pp: Preprocessor = None):
+    # index maps root-relative file paths to scan entries and is updated in
+    # place. Files whose mtime and size are unchanged are not parsed again,
+    # only read for the bodies of the functions they yield. Headers are
+    # indexed for the symbol table but yield no items.
+    index = {} if index is None else index
+    stats = {} if stats is None else stats
+    for k in ("files", "reused", "rehashed", "parsed", "removed"):
+        stats.setdefault(k, 0)
+    target_rel = target.relative_to(root)
+    plan = []
+    seen = set()
+    stat_cache = {}
+    for p in chain(target.rglob('*.c'), target.rglob('*.h')):
+        rel = str(p.relative_to(root))
+        seen.add(rel)
+        prev = index.get(rel)
+        if prev is not None and not pp_current(prev, pp, stat_cache):
+            del index[rel]
+            prev = None
+        if prev is not None:
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            if prev["mtime"] == st.st_mtime_ns and prev["size"] == st.st_size:
+                plan.append((rel, p, False))
+                continue
+        plan.append((rel, p, True))
+    for rel in [r for r in index if r not in seen and Path(r).is_relative_to(target_rel)]:
+        del index[rel]
+        stats["removed"] += 1
+
+    todo = [(p, index[rel]["hash"] if rel in index else None) for rel, p, changed in plan if changed]
+    ex = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 and len(todo) > 1 else None
+    try:
+        paths = [p for p, _ in todo]
+        hashes = [h for _, h in todo]
+        # Parsed headers are cached per process, so each worker reuses them
+        # across the files it scans
+        if ex is None:
+            results = map(partial(scan_file, root, pp=pp), paths, hashes)
+        else:
+            # Submission order keeps output deterministic; the window keeps a
+            # slow consumer (--stream analysis) from piling up scanned files
+            results = bounded_map(ex, partial(scan_file, root, pp=pp), paths, hashes, window=jobs * 4)
+        for rel, p, changed in plan:
+            if not changed:
+                entry = index[rel]
+                if entry["functions"]:
+                    try:
+                        text = decode_source(p.read_bytes())
+                    except OSError:
+                        index.pop(rel, None)
+                        continue
+                stats["reused"] += 1
+            else:
+                scanned = next(results)
+                if scanned is None:
+                    index.pop(rel, None)
+                    continue
+                entry, text = scanned
+                if entry["functions"] is None:
+                    for k in ("functions", "symbols", "deps"):
+                        if k in index[rel]:
+                            entry[k] = index[rel][k]
+                    stats["rehashed"] += 1
+                else:
+                    stats["parsed"] += 1
+                index[rel] = entry
+            stats["files"] += 1
+            for f in entry["functions"]:
+                item = {
+                    "file": rel,
+                    "function": f[0],
+                    "line": f[1],
+                    "content": text[f[2]:f[3]]
+                }
+                if len(f) > 4:
+                    item["macros"] = f[4]
+                yield item
+    finally:
+        if ex is not None:
+            ex.shutdown(cancel_futures=True)
+
+
+def scan_functions(root: Path, target: Path, jobs: int = 1, index: dict = None, stats: dict = None,
+                   pp: Preprocessor = None):
+    return list(iter_scan(root, target, jobs, index, stats, pp))
+
+
+def symbol_table(root: Path, target: Path, index: dict) -> SymbolTable:
+    # Only files under the current target form the program being linked
+    target_rel = target.relative_to(root)
+    return SymbolTable({rel: e for rel, e in index.items() if Path(rel).is_relative_to(target_rel)})
+
+
+def load_scan_index(root: Path):
+    index_path = root / 'llm' / 'scan_index.json'
+    if index_path.exists():
         try:
-            t = p.read_text(encoding='utf-8', errors='ignore')
+            data = json.loads(index_path.read_text(encoding='utf-8'))
+            if data.get("version") == SCAN_INDEX_VERSION:
+                return data.get("files", {})
         except Exception:
+            return {}
+    return {}
+
+
+def save_scan_index(root: Path, index: dict):
+    index_path = root / 'llm' / 'scan_index.json'
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    # Written through json.dump in chunks rather than as one string, then
+    # swapped in so an interrupted save keeps the previous index
+    tmp_path = index_path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"version": SCAN_INDEX_VERSION, "files": index}, f, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+
+
+class Progress:
+    # Periodic "done/total, rate, ETA" line for long analysis runs
+    def __init__(self, total=None, interval: float = 2.0):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.start = time.monotonic()
+        self.last = self.start
+        self.printed = 0
+
+    def line(self):
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        rate = self.done / elapsed
+        msg = f"Analyzed {self.done}" + (f"/{self.total}" if self.total is not None else "") + f" functions, {rate:.1f}/s"
+        if self.total is not None and rate > 0:
+            msg += f", ETA {max(self.total - self.done, 0) / rate:.0f}s"
+        return msg
+
+    def update(self, n: int = 1):
+        self.done += n
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.printed = self.done
+            print(self.line(), flush=True)
+
+    def finish(self):
+        if self.done != self.printed:
+            print(self.line(), flush=True)
+
+
+async def analyze_bounded(jobs, max_concurrency: int, on_result, progress: Progress, scheduler: Scheduler = None,
+                          client_options: dict = None):
+    # At most max_concurrency requests in flight and as many jobs queued;
+    # jobs may be a lazy iterator of [(index, item), ...] lists and results
+    # are delivered as they complete.
+    limit = max(1, max_concurrency)
+    queue = asyncio.Queue(maxsize=limit)
+    sem = asyncio.Semaphore(limit)
+    aclient = None
+    workers = []
+
+    async def worker():
+        while True:
+            job = await queue.get()
+            if job is None:
+                return
+            if len(job) == 1:
+                outs = [await af.analyze_async(aclient, job[0][1], sem, scheduler)]
+            else:
+                outs = await af.analyze_batch_async(aclient, [it for _, it in job], sem, scheduler)
+            for (i, it), nr in zip(job, outs):
+                on_result(i, it, nr)
+            progress.update(len(job))
+
+    async def put(job):
+        if not queue.full():
+            queue.put_nowait(job)
+            return
+        # Wait for space, but surface a worker failure instead of blocking
+        task = asyncio.create_task(queue.put(job))
+        await asyncio.wait([task, *workers], return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            task.cancel()
+            for w in workers:
+                if w.done():
+                    w.result()
+            raise RuntimeError("analysis worker exited early")
+
+    try:
+        for job in jobs:
+            if aclient is None:
+                # One pooled client for the whole run, sized to the concurrency limit
+                aclient = make_async_client(af.BASE_URL, af.API_KEY, limit, **(client_options or {}))
+                workers = [asyncio.create_task(worker()) for _ in range(limit)]
+            await put(job)
+        # Shutdown sentinels go through the same wait, so a worker that fails
+        # with jobs still queued cannot leave them blocked
+        for _ in workers:
+            await put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for w in workers:
+            w.cancel()
+        if aclient is not None:
+            await aclient.close()
+
+
+class InflightDedup:
+    """Send each distinct function body to the LLM once per run.
+
+    Entries whose body (and origin hint, which is part of the prompt) matches
+    one already dispatched wait for that result and are completed from it
+    via merge_result, keeping their own file_path / line_number.
+    """
+
+    def __init__(self, on_result, progress: Progress, stats: dict):
+        self.on_result = on_result
+        self.progress = progress
+        self.stats = stats
+        self.waiting = {}  # key -> followers of the in-flight leader
+        self.done = {}     # key -> model fields of the finished leader
+        stats.setdefault("deduped", 0)
+
+    @staticmethod
+    def key(it: dict):
+        return compute_hash(it["content"]), af.classify_origin(it["file"])
+
+    def entries(self, entries):
+        for i, it in entries:
+            k = self.key(it)
+            if k in self.done:
+                self.complete(i, it, self.done[k])
+            elif k in self.waiting:
+                self.waiting[k].append((i, it))
+            else:
+                self.waiting[k] = []
+                yield i, it
+
+    def complete(self, i, it, model_json):
+        self.on_result(i, it, af.merge_result(it, model_json))
+        self.stats["deduped"] += 1
+        self.progress.update()
+
+    def result(self, i, it, nr):
+        self.on_result(i, it, nr)
+        k = self.key(it)
+        fields = {f: nr[f] for f in ("origin", "summary", "calls", "confidence", "notes")}
+        self.done[k] = fields
+        for j, jt in self.waiting.pop(k, ()):
+            self.complete(j, jt, fields)
+
+
+def triage_entries(entries, threshold: float, on_result, progress: Progress, stats: dict):
+    # Static-first triage: functions scoring below the threshold keep their
+    # static result (not cached, so a later run without triage still sends
+    # them to the LLM); the rest are passed through for LLM analysis.
+    for k in ("triaged", "llm_items"):
+        stats.setdefault(k, 0)
+    for i, it in entries:
+        calls = af.extract_calls_with_conditions(it["content"], it["function"], it.get("macros"))
+        score = af.complexity_score(it, calls)
+        if score < threshold:
+            sa = af.static_analyze(it)
+            sa["notes"] = f"static_triage (score {score:.1f}); " + sa["notes"]
+            on_result(i, it, af.merge_result(it, sa))
+            stats["triaged"] += 1
+            progress.update()
             continue
-        for name, line, func_text in extract_functions_from_text(t):
-            items.append({
-                "file": str(p.relative_to(root)),
-                "function": name,
-                "line": line,
-                "content": func_text
-            })
-    return items
+        stats["llm_items"] += 1
+        yield i, it
+
+
+def format_triage_stats(stats: dict):
+    triaged = stats.get("triaged", 0)
+    sent = stats.get("llm_items", 0)
+    if not triaged and not sent:
+        return None
+    line = f"Triage: {triaged} of {triaged + sent} functions accepted from static analysis ({triaged} LLM calls saved"
+    if sent and stats.get("llm_s"):
+        line += f", ~{triaged * stats['llm_s'] / sent:.1f}s at this run's pace"
+    return line + ")"
+
+
+def parse_budget(text: str):
+    # "200" caps LLM jobs (one function or one batch), "90s" / "30m" / "2h"
+    # caps LLM time
+    units = {"s": 1, "m": 60, "h": 3600}
+    text = text.strip().lower()
+    if text and text[-1] in units:
+        return {"seconds": float(text[:-1]) * units[text[-1]]}
+    return {"jobs": int(text)}
 
 
-def analyze_items(items, mode: str, max_concurrency: int):
+def budget_jobs(jobs, budget: dict, t0: float, on_result, progress: Progress, stats: dict):
+    # Stops dispatching LLM work once the job or time budget is spent; a job
+    # counts once even if a malformed batch reply is retried item by item. The
+    # remaining functions get (uncached) static results so the report is complete
+    stats.setdefault("over_budget", 0)
+    dispatched = 0
+    for job in jobs:
+        spent = (("jobs" in budget and dispatched >= budget["jobs"])
+                 or ("seconds" in budget and time.time() - t0 >= budget["seconds"]))
+        if not spent:
+            dispatched += 1
+            yield job
+            continue
+        for i, it in job:
+            sa = af.static_analyze(it)
+            sa["notes"] = "budget_exhausted; " + sa["notes"]
+            on_result(i, it, af.merge_result(it, sa))
+            stats["over_budget"] += 1
+        progress.update(len(job))
+
+
+def analyze_stream(items, mode: str, max_concurrency: int, on_result, total=None, scheduler: Scheduler = None,
+                   batch_tokens: int = 0, triage: float = 0, stats: dict = None, budget: dict = None,
+                   client_options: dict = None):
+    # Calls on_result(index, item, result) as soon as each analysis finishes.
+    # With batch_tokens > 0, LLM modes pack functions from the same file into
+    # one request up to that many estimated content tokens. With triage > 0,
+    # only functions whose complexity score reaches it go to the LLM. A budget
+    # ({"jobs": n} or {"seconds": s}) bounds the LLM work of the run.
+    # client_options (http2, timeout, connect_timeout) tune the HTTP transport.
+    if mode not in ('fallback', 'sync', 'async'):
+        raise ValueError(f"Unknown mode: {mode}")
+    if scheduler is None:
+        scheduler = Scheduler()
+    stats = {} if stats is None else stats
+    progress = Progress(total)
     if mode == 'fallback':
-        return [af.merge_result(it, af.static_analyze(it)) for it in items]
-    elif mode == 'sync':
-        client = af.OpenAI(base_url=af.BASE_URL, api_key=af.API_KEY)
-        return [af.analyze_sync(client, it) for it in items]
-    elif mode == 'async':
-        async def run():
-            aclient = af.AsyncOpenAI(base_url=af.BASE_URL, api_key=af.API_KEY)
-            sem = asyncio.Semaphore(max(1, max_concurrency))
-            tasks = [af.analyze_async(aclient, it, sem) for it in items]
-            return await asyncio.gather(*tasks)
-        return asyncio.run(run())
+        for i, it in enumerate(items):
+            on_result(i, it, af.merge_result(it, af.static_analyze(it)))
+            progress.update()
+        progress.finish()
+        return
+    t0 = time.time()
+    # Identical bodies are analyzed once; on_result also fans out to copies
+    dedup = InflightDedup(on_result, progress, stats)
+    on_result = dedup.result
+    entries = dedup.entries(enumerate(items))
+    if triage > 0:
+        entries = triage_entries(entries, triage, on_result, progress, stats)
+    if batch_tokens > 0:
+        jobs = af.pack_batches(entries, batch_tokens)
     else:
-        raise ValueError(f"Unknown mode: {mode}")
+        jobs = ([entry] for entry in entries)
+    if budget:
+        jobs = budget_jobs(jobs, budget, t0, on_result, progress, stats)
+    if mode == 'sync':
+        client = None
+        for job in jobs:
+            if client is None:
+                client = make_client(af.BASE_URL, af.API_KEY, 1, **(client_options or {}))
+            if len(job) == 1:
+                outs = [af.analyze_sync(client, job[0][1], scheduler)]
+            else:
+                outs = af.analyze_batch_sync(client, [it for _, it in job], scheduler)
+            for (i, it), nr in zip(job, outs):
+                on_result(i, it, nr)
+            progress.update(len(job))
+        if client is not None:
+            client.close()
+    else:
+        asyncio.run(analyze_bounded(jobs, max_concurrency, on_result, progress, scheduler, client_options))
+    stats["llm_s"] = stats.get("llm_s", 0.0) + time.time() - t0
+    progress.finish()
 
 
 def make_key(item):
@@ -53,19 +476,84 @@ def compute_hash(content: str) -> str:
 
 
 def load_store(root: Path):
-    store_path = root / 'llm' / 'function_analysis_store.json'
-    if store_path.exists():
-        try:
-            return json.loads(store_path.read_text(encoding='utf-8'))
-        except Exception:
-            return {}
-    return {}
+    # Results are committed one by one to SQLite; a legacy JSON store is
+    # imported the first time the database is created.
+    llm_dir = root / 'llm'
+    return AnalysisStore(llm_dir / 'function_analysis_store.db', llm_dir / 'function_analysis_store.json')
+
+
+def lookup_cached(store, it: dict, key: str, h: str, fingerprint: str, stats: dict):
+    # Exact location first, then any identical body analyzed with the same
+    # prompt/model and origin hint; content hits are re-keyed to this item's
+    # location and take their origin from this item's file.
+    for k in ("key_hits", "content_hits", "misses"):
+        stats.setdefault(k, 0)
+    cached = store.get(key)
+    if cached and cached.get("content_hash") == h:
+        stats["key_hits"] += 1
+        return cached
+    origin = af.classify_origin(it["file"])
+    cached = store.find_by_content(h, fingerprint, origin)
+    if cached:
+        nr = af.merge_result(it, cached)
+        nr["origin"] = origin
+        nr["content_hash"] = h
+        store.put(key, nr, fingerprint, origin)
+        stats["content_hits"] += 1
+        return nr
+    stats["misses"] += 1
+    return None
+
+
+def format_cache_stats(stats: dict) -> str:
+    total = stats.get("key_hits", 0) + stats.get("content_hits", 0) + stats.get("misses", 0)
+    hits = stats.get("key_hits", 0) + stats.get("content_hits", 0)
+    rate = 100.0 * hits / total if total else 0.0
+    return (f"Cache: {stats.get('key_hits', 0)} key hits, {stats.get('content_hits', 0)} content hits, "
+            f"{stats.get('misses', 0)} misses ({rate:.1f}% hit rate)")
+
+
+def store_result(store, nr: dict, h: str, mode: str, fingerprint: str = None):
+    # Attach the content hash and cache successful LLM results; returns the key
+    # when the store was updated
+    fp = nr["file_path"].replace("\\", "/")
+    key = f"{fp}:{nr['function_name']}:{nr['line_number']}"
+    if h:
+        nr["content_hash"] = h
+    if mode in ("sync", "async") and "fallback_static_analysis" not in nr.get("notes", ""):
+        store.put(key, nr, fingerprint, af.classify_origin(fp))
+        return key
+    return None
+
+
+def process_items(items, store, mode: str, max_concurrency: int, emit, stats: dict = None, fingerprint: str = None,
+                  scheduler: Scheduler = None, batch_tokens: int = 0, triage: float = 0, budget: dict = None,
+                  client_options: dict = None):
+    # Streaming counterpart of the cache check + analysis step: cache hits are
+    # emitted as they are found, misses as soon as their analysis completes
+    # (and are persisted to the store at the same moment).
+    stats = {} if stats is None else stats
+    for k in ("analyzed", "stored"):
+        stats.setdefault(k, 0)
+
+    def misses():
+        for it in items:
+            key = make_key(it)
+            h = compute_hash(it["content"])
+            cached = lookup_cached(store, it, key, h, fingerprint, stats)
+            if cached:
+                emit(cached)
+                continue
+            yield it
 
+    def record(i, it, nr):
+        if store_result(store, nr, compute_hash(it["content"]), mode, fingerprint):
+            stats["stored"] += 1
+        stats["analyzed"] += 1
+        emit(nr)
 
-def save_store(root: Path, store: dict):
-    store_path = root / 'llm' / 'function_analysis_store.json'
-    store_path.parent.mkdir(parents=True, exist_ok=True)
-    store_path.write_text(json.dumps(store, ensure_ascii=False, indent=2), encoding='utf-8')
+    analyze_stream(misses(), mode, max_concurrency, record, scheduler=scheduler, batch_tokens=batch_tokens,
+                   triage=triage, stats=stats, budget=budget, client_options=client_options)
 
 
 def main():
@@ -73,10 +561,45 @@ def main():
     parser.add_argument('--target', type=str, default=str(Path('examples') / 'linux_serial_demo'))
     parser.add_argument('--mode', type=str, choices=['fallback', 'sync', 'async'], default='fallback')
     parser.add_argument('--max-concurrency', type=int, default=5)
+    parser.add_argument('--rps', type=float, default=None, help='LLM requests per second budget')
+    parser.add_argument('--tpm', type=float, default=None, help='LLM prompt tokens per minute budget')
+    parser.add_argument('--max-retries', type=int, default=5, help='retries for transient LLM errors (429, 5xx, timeouts)')
+    parser.add_argument('--http2', action='store_true', help='use HTTP/2 for LLM requests (needs the h2 package)')
+    parser.add_argument('--timeout', type=float, default=60.0, help='LLM request timeout in seconds')
+    parser.add_argument('--connect-timeout', type=float, default=10.0, help='LLM connect timeout in seconds')
+    parser.add_argument('--batch-tokens', type=int, default=0,
+                        help='pack functions from the same file into one LLM request up to this many content tokens (0 = off)')
+    parser.add_argument('--trim-content', action='store_true',
+                        help='strip comments and indentation from function bodies sent to the LLM')
+    parser.add_argument('--triage', type=float, default=0,
+                        help='accept the static result for functions whose complexity score is below this (0 = off)')
+    parser.add_argument('--order', type=str, choices=list(ORDERS), default='scan',
+                        help='LLM work order: scan order, call-graph centrality, fan-in, or depth from entry points')
+    parser.add_argument('--budget', type=parse_budget, default=None,
+                        help='stop LLM work after N jobs (single functions or batches) or a duration such as 90s, 30m, 2h')
+    parser.add_argument('--jobs', type=int, default=1, help='scan worker processes (0 = one per CPU)')
     parser.add_argument('--output', type=str, default=str(Path('visualization') / 'report.html'))
+    parser.add_argument('--report-format', type=str, choices=['inline', 'compact'], default='inline',
+                        help='compact keeps function bodies in compressed chunks next to the report, loaded on demand')
+    parser.add_argument('--layout', type=str, choices=['browser', 'layered'], default='browser',
+                        help='global view layout: Dagre in the browser, or layered positions precomputed at build time')
+    parser.add_argument('--hierarchy', action='store_true',
+                        help='global view starts from directory/file clusters that expand on demand')
+    parser.add_argument('--assets-dir', type=str, default=None,
+                        help='write Cytoscape/Dagre once to this directory and reference them instead of inlining')
     parser.add_argument('--keep-json', action='store_true')
     parser.add_argument('--clean', action='store_true')
+    parser.add_argument('--rescan', action='store_true', help='ignore the scan index and re-parse every file')
+    parser.add_argument('--preprocess', action='store_true',
+                        help='evaluate #if blocks, includes and file-scope macros before scanning .c files')
+    parser.add_argument('-I', '--include-dir', action='append', default=[],
+                        help='include search path for --preprocess (repeatable; implies --preprocess)')
+    parser.add_argument('-D', '--define', action='append', default=[],
+                        help='NAME, NAME=VALUE or NAME(args)=BODY for --preprocess (repeatable; implies --preprocess)')
+    parser.add_argument('--stream', action='store_true', help='stream scan -> analysis -> report through llm/function_analysis.ndjson')
     args = parser.parse_args()
+    if args.stream and args.order != 'scan':
+        parser.error('--order needs the whole call graph and cannot be combined with --stream')
 
     root = Path(__file__).resolve().parent
     target = (root / args.target).resolve()
@@ -86,6 +609,7 @@ def main():
     if args.clean:
         # Remove previous outputs if present
         for p in [root / 'llm' / 'function_analysis.json',
+                  root / 'llm' / 'function_analysis.ndjson',
                   root / 'llm' / 'function_analysis_serial.json',
                   root / 'llm' / 'function_analysis_async.json',
                   root / 'visualization' / 'report.html']:
@@ -94,52 +618,102 @@ def main():
                     p.unlink()
             except Exception:
                 pass
+        shutil.rmtree(root / 'visualization' / 'report_bodies', ignore_errors=True)
 
-    items = scan_functions(root, target)
-
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    scan_index = {} if args.rescan else load_scan_index(root)
+    scan_stats = {}
+    pp = None
+    if args.preprocess or args.include_dir or args.define:
+        pp = Preprocessor([(root / d).resolve() for d in args.include_dir], args.define)
     store = load_store(root)
-    results = []
-    to_analyze = []
-    pending_hashes = {}
-    for it in items:
-        key = make_key(it)
-        h = compute_hash(it["content"])
-        cached = store.get(key)
-        if cached and cached.get("content_hash") == h:
-            results.append(cached)
-        else:
-            to_analyze.append(it)
-            pending_hashes[key] = h
-
-    new_results = analyze_items(to_analyze, args.mode, args.max_concurrency) if to_analyze else []
-
-    store_updated = False
-    for nr in new_results:
-        # Build key from analysis result for consistency
-        fp = nr["file_path"].replace("\\", "/")
-        key = f"{fp}:{nr['function_name']}:{nr['line_number']}"
-        h = pending_hashes.get(key)
-        if h:
-            nr["content_hash"] = h
-        results.append(nr)
-        if args.mode in ("sync", "async"):
-            note = nr.get("notes", "")
-            if "fallback_static_analysis" not in note:
-                store[key] = nr
-                store_updated = True
-
-    if store_updated:
-        save_store(root, store)
-
-    # Write temp JSON for report generation
-    tmp_json = root / 'llm' / 'function_analysis.json'
-    tmp_json.parent.mkdir(parents=True, exist_ok=True)
-    tmp_json.write_text(json.dumps(results, ensure_ascii=False), encoding='utf-8')
+    if args.trim_content:
+        af.TRIM_CONTENT = True
+    fingerprint = af.prompt_fingerprint()
+    scheduler = Scheduler(requests_per_sec=args.rps, tokens_per_min=args.tpm, max_retries=args.max_retries)
+    run_stats = {}
+    symbols = None
+    client_options = {"http2": args.http2, "timeout": args.timeout, "connect_timeout": args.connect_timeout}
+
+    if args.stream:
+        # Items, results and report data flow one record at a time
+        items = iter_scan(root, target, jobs, scan_index, scan_stats, pp)
+        tmp_json = root / 'llm' / 'function_analysis.ndjson'
+        tmp_json.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_json, 'w', encoding='utf-8') as f:
+            def emit(nr):
+                f.write(json.dumps(nr, ensure_ascii=False))
+                f.write('\n')
+            process_items(items, store, args.mode, args.max_concurrency, emit, run_stats, fingerprint, scheduler,
+                          args.batch_tokens, args.triage, args.budget, client_options)
+    else:
+        items = scan_functions(root, target, jobs, scan_index, scan_stats, pp)
+        results = []
+        to_analyze = []
+        pending_hashes = {}
+        for it in items:
+            key = make_key(it)
+            h = compute_hash(it["content"])
+            cached = lookup_cached(store, it, key, h, fingerprint, run_stats)
+            if cached:
+                results.append(cached)
+            else:
+                to_analyze.append(it)
+                pending_hashes[key] = h
+        if to_analyze and args.order != 'scan':
+            # Rank on the whole call graph so an interrupted or budgeted run
+            # has the most central functions analyzed first
+            symbols = symbol_table(root, target, scan_index)
+            rank = {id(items[i]): pos for pos, i in enumerate(priority_order(items, args.order, symbols))}
+            to_analyze.sort(key=lambda it: rank[id(it)])
+
+        # Each result is persisted as soon as it arrives; order follows to_analyze
+        new_results = [None] * len(to_analyze)
+
+        def record(i, it, nr):
+            store_result(store, nr, pending_hashes.get(make_key(it)), args.mode, fingerprint)
+            new_results[i] = nr
+
+        if to_analyze:
+            analyze_stream(to_analyze, args.mode, args.max_concurrency, record, total=len(to_analyze),
+                           scheduler=scheduler, batch_tokens=args.batch_tokens, triage=args.triage,
+                           stats=run_stats, budget=args.budget, client_options=client_options)
+        results.extend(new_results)
+
+        # Write temp JSON for report generation
+        tmp_json = root / 'llm' / 'function_analysis.json'
+        tmp_json.parent.mkdir(parents=True, exist_ok=True)
+        tmp_json.write_text(json.dumps(results, ensure_ascii=False), encoding='utf-8')
+
+    print(f"Scanned {scan_stats['files']} files: {scan_stats['reused']} unchanged, "
+          f"{scan_stats['rehashed']} touched, {scan_stats['parsed']} parsed, {scan_stats['removed']} removed")
+    if scan_stats['rehashed'] or scan_stats['parsed'] or scan_stats['removed']:
+        save_scan_index(root, scan_index)
+    if symbols is None:
+        symbols = symbol_table(root, target, scan_index)
+    print(format_cache_stats(run_stats))
+    if scheduler.stats["calls"]:
+        print(f"LLM: {scheduler.stats['calls']} requests, {scheduler.stats['retries']} retries, "
+              f"{scheduler.stats['throttled_s']:.1f}s throttled")
+    if run_stats.get("deduped"):
+        print(f"Dedup: {run_stats['deduped']} functions reused an identical body analyzed in this run")
+    if run_stats.get("over_budget"):
+        print(f"Budget: spent, {run_stats['over_budget']} functions left to static analysis")
+    triage_line = format_triage_stats(run_stats)
+    if triage_line:
+        print(triage_line)
+    prompt_line = af.format_prompt_stats()
+    if prompt_line:
+        print(prompt_line)
+    store.close()
 
     # Generate HTML report
     output_path = (root / args.output).resolve()
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    generate_report(str(tmp_json), str(output_path))
+    assets_dir = (root / args.assets_dir).resolve() if args.assets_dir else None
+    generate_report(str(tmp_json), str(output_path), compact=args.report_format == 'compact', assets_dir=assets_dir,
+                    layout=args.layout == 'layered', hierarchy=args.hierarchy, symbols=symbols)
+    print(symbols.summary())
 
     if not args.keep_json:
         try:
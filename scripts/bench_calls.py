@@ -0,0 +1,59 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llm.analyze_functions import extract_calls_with_conditions
+
+# One guard at the top followed by long guard-free cases: the nearest `if`
+# for most calls is thousands of lines back.
+HEAD = """static long big_ioctl(struct file *file, unsigned int cmd, unsigned long arg) {
+    if (!dev)
+        return -ENODEV;
+    switch (cmd) {
+"""
+
+CASE = """    case CMD_%(i)d:
+        lock_dev(dev);
+        ret = apply_mode_%(i)d(dev, &cfg);
+        update_stats(dev, %(i)d);
+        unlock_dev(dev);
+        break;
+"""
+
+
+def make_function(n_lines):
+    parts = [HEAD]
+    lines = HEAD.count("\n")
+    i = 0
+    while lines < n_lines:
+        chunk = CASE % {"i": i}
+        parts.append(chunk)
+        lines += chunk.count("\n")
+        i += 1
+    parts.append("    default:\n        return -EINVAL;\n    }\n}\n")
+    return "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=str, default="500,1000,2000,5000,10000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(f"{'lines':>8} {'calls':>8} {'seconds':>9} {'us/line':>8}")
+    for spec in args.lines.split(","):
+        n = int(spec)
+        content = make_function(n)
+        best = None
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            calls = extract_calls_with_conditions(content, "big_ioctl")
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        print(f"{n:>8} {len(calls):>8} {best:>9.4f} {best * 1e6 / n:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
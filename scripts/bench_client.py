@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llm.clients import make_async_client
+from scripts.mock_llm_server import Handler, MockServer
+
+# Requests/sec against the in-process mock server at several concurrency
+# levels: one pooled keep-alive client per run ("pooled"), the same client
+# with connections closed after each request ("no-keepalive"), and a new
+# client for every request ("fresh", the cost of building clients per call).
+MESSAGES = [{"role": "system", "content": "You are a strict JSON generator."},
+            {"role": "user", "content": "Function content begins:\nint f(void) { return g(); }\nFunction content ends."}]
+
+
+def start_server(latency: float):
+    Handler.args = argparse.Namespace(verbose=False, fail_rate=0.0, latency=latency, retry_after=0.1,
+                                      drop_rate=0.0)
+    server = MockServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+async def run(base_url: str, mode: str, concurrency: int, requests: int, http2: bool) -> float:
+    shared = None
+    if mode == "pooled":
+        shared = make_async_client(base_url, "x", concurrency, http2=http2)
+    elif mode == "no-keepalive":
+        shared = make_async_client(base_url, "x", concurrency, http2=http2, keepalive_expiry=0)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            client = shared or make_async_client(base_url, "x", 1, http2=http2)
+            try:
+                await client.chat.completions.create(model="mock", messages=MESSAGES, temperature=0)
+            finally:
+                if shared is None:
+                    await client.close()
+
+    t0 = time.perf_counter()
+    try:
+        await asyncio.gather(*(one() for _ in range(requests)))
+    finally:
+        if shared is not None:
+            await shared.close()
+    return requests / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=str, default="1,4,16,64")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the mock server adds per response")
+    parser.add_argument("--http2", action="store_true")
+    args = parser.parse_args()
+    server, base_url = start_server(args.latency)
+    print(f"{'concurrency':>11} {'pooled rps':>11} {'no-keepalive rps':>17} {'fresh rps':>10}")
+    try:
+        for spec in args.concurrency.split(","):
+            n = int(spec)
+            pooled, closing, fresh = (asyncio.run(run(base_url, mode, n, args.requests, args.http2))
+                                      for mode in ("pooled", "no-keepalive", "fresh"))
+            print(f"{n:>11} {pooled:>11.1f} {closing:>17.1f} {fresh:>10.1f}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.scan_c_functions import extract_functions_from_text
+
+UNIT = """/* helper %(i)d: copies data between ring buffers */
+static int helper_%(i)d(struct ring *r, const char *buf, size_t len)
+{
+    // "{" inside comments and strings must not confuse the scanner
+    if (len == 0)
+        return 0;
+    if (!r) {
+        pr_err("helper_%(i)d: no ring {%%d}\\n", -EINVAL);
+        return -EINVAL;
+    }
+#ifdef CONFIG_DEBUG
+    pr_debug("len=%%zu '%%c'\\n", len, '}');
+#endif
+    return ring_push(r, buf, len);
+}
+
+"""
+
+
+def make_source(size):
+    parts = []
+    total = 0
+    i = 0
+    while total < size:
+        chunk = UNIT % {"i": i}
+        parts.append(chunk)
+        total += len(chunk)
+        i += 1
+    return "".join(parts), i
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=str, default="10K,100K,1M,10M,50M")
+    args = parser.parse_args()
+    mult = {"K": 1024, "M": 1024 * 1024}
+    print(f"{'size':>8} {'funcs':>8} {'seconds':>9} {'MB/s':>8} {'us/KB':>8}")
+    for spec in args.sizes.split(","):
+        spec = spec.strip().upper()
+        size = int(spec[:-1]) * mult[spec[-1]] if spec[-1] in mult else int(spec)
+        text, expected = make_source(size)
+        t0 = time.perf_counter()
+        funcs = extract_functions_from_text(text)
+        dt = time.perf_counter() - t0
+        assert len(funcs) == expected, (len(funcs), expected)
+        mb = len(text) / (1024 * 1024)
+        print(f"{spec:>8} {len(funcs):>8} {dt:>9.3f} {mb / dt:>8.1f} {dt * 1e6 / (len(text) / 1024):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Minimal OpenAI-compatible chat completions endpoint for exercising retries,
+# rate limiting and throughput without a real model:
+#   python scripts/mock_llm_server.py --port 8765 --fail-rate 0.2
+#   BASE_URL=http://127.0.0.1:8765/v1 API_KEY=x MODEL=mock python main.py --mode async
+
+STATE = {"requests": 0, "failures": 0}
+LOCK = threading.Lock()
+
+
+def make_entry(name=None, line=None):
+    entry = {
+        "origin": "unknown",
+        "summary": "mock analysis",
+        "calls": [],
+        "confidence": 0.5,
+        "notes": "mock_llm_server",
+    }
+    if name is not None:
+        entry["function_name"] = name
+        entry["line_number"] = int(line)
+    return entry
+
+
+def make_reply(model, messages, drop_rate=0.0):
+    # Batched prompts ask for {"results": [...]}; answer one entry per
+    # "Name: ... Line: ..." header, dropping some to exercise the fallback
+    if any('"results"' in m.get("content", "") for m in messages if m.get("role") == "system"):
+        found = re.findall(r"Name: (\w+)\. Line: (\d+)\.", messages[-1].get("content", ""))
+        body = {"results": [make_entry(n, l) for n, l in found if random.random() >= drop_rate]}
+    else:
+        body = make_entry()
+    content = json.dumps(body)
+    prompt_chars = sum(len(m.get("content", "")) for m in messages)
+    return {
+        "id": f"mock-{STATE['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model or "mock",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(content) // 4,
+                  "total_tokens": (prompt_chars + len(content)) // 4},
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY every
+    # keep-alive response waits on a delayed ACK
+    disable_nagle_algorithm = True
+    args = None
+
+    def log_message(self, fmt, *a):
+        if self.args.verbose:
+            super().log_message(fmt, *a)
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        with LOCK:
+            STATE["requests"] += 1
+            fail = random.random() < self.args.fail_rate
+            if fail:
+                STATE["failures"] += 1
+        if self.args.latency:
+            time.sleep(self.args.latency)
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": "not found"}})
+            return
+        if fail:
+            if random.random() < 0.5:
+                self.send_json(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                               {"Retry-After": str(self.args.retry_after)})
+            else:
+                self.send_json(503, {"error": {"message": "overloaded", "type": "server_error"}})
+            return
+        self.send_json(200, make_reply(payload.get("model"), payload.get("messages", []), self.args.drop_rate))
+
+
+class MockServer(ThreadingHTTPServer):
+    # The default listen backlog (5) drops connections when many clients
+    # connect at once
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 429/503")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds sent with 429")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of batch entries left out of replies")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    Handler.args = args
+    server = MockServer((args.host, args.port), Handler)
+    print(f"Mock LLM server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"requests={STATE['requests']} failures={STATE['failures']}")
+
+
+if __name__ == "__main__":
+    main()
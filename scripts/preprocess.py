@@ -0,0 +1,541 @@
+import hashlib
+import os
+import re
+from pathlib import Path
+
+# Lightweight C preprocessor for the scan stage. It evaluates conditional
+# blocks (#if/#ifdef/#elif/#else/#endif with defined(), macros and integer
+# arithmetic), follows #include through the configured include paths and
+# expands function-like macros at file scope, so functions declared through
+# wrappers (SYSCALL_DEFINE3(...) { ... }) are found by their real name.
+#
+# The output keeps the input's line layout: inactive lines are blanked and a
+# file-scope expansion is written on the line where the invocation starts,
+# so scanner line numbers still point at the original file and function
+# bodies can be cut from the original text.
+#
+# Headers are cached per process. A header's effect (macros defined or
+# undefined, headers read, #pragma once) is stored together with the macro
+# values it tested; later includes with the same values reuse the effect
+# instead of reading the header again. Include guards fall out of this: the
+# second include sees the guard defined and only re-evaluates the #ifndef.
+
+_COMMENT_OR_LITERAL_RE = re.compile(r"""/\*.*?(?:\*/|\Z)|//[^\n]*|"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?""",
+                                    re.DOTALL)
+_DIRECTIVE_RE = re.compile(r"[ \t]*#[ \t]*([A-Za-z_]\w*)?(.*)", re.DOTALL)
+_DEFINE_RE = re.compile(r"([A-Za-z_]\w*)(\([^)]*\))?(.*)", re.DOTALL)
+_INCLUDE_RE = re.compile(r'\s*(?:"([^"]+)"|<([^>]+)>)')
+_TOKEN_RE = re.compile(r"""
+    [A-Za-z_]\w*
+  | \.?\d(?:[eEpP][+-]|[\w.])*
+  | "(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'
+  | \#\#|\.\.\.|<<=|>>=|->|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||[-+*/%&|^]=
+  | \S
+""", re.VERBOSE)
+_IDENT_RE = re.compile(r"[A-Za-z_]\w*")
+_NOT_CALLS = {"if", "for", "while", "switch", "return", "sizeof", "defined", "typeof", "__typeof__",
+              "__attribute__", "__attribute", "_Generic", "_Static_assert", "__builtin_expect"}
+_BINARY = {"*": 10, "/": 10, "%": 10, "+": 9, "-": 9, "<<": 8, ">>": 8, "<": 7, "<=": 7, ">": 7, ">=": 7,
+           "==": 6, "!=": 6, "&": 5, "^": 4, "|": 3, "&&": 2, "||": 1}
+
+# path -> {"stat": (mtime_ns, size), "raw": [...], "code": [...], "variants": [...]}
+_HEADER_CACHE = {}
+
+
+def _strip_comments(text: str) -> str:
+    # Comments become spaces (newlines kept) so directives inside them are
+    # ignored; literals are left alone
+    def blank(m):
+        s = m.group()
+        return re.sub(r"[^\n]", " ", s) if s[0] == "/" else s
+    return _COMMENT_OR_LITERAL_RE.sub(blank, text)
+
+
+def _tokens(text: str):
+    return _TOKEN_RE.findall(text)
+
+
+def _is_ident(tok: str) -> bool:
+    return tok[0].isalpha() or tok[0] == "_"
+
+
+def _collect_args(toks, i):
+    # toks[i] is '('; returns (argument token lists, index after ')') or
+    # (None, i) when the parentheses do not close
+    args = [[]]
+    depth = 0
+    for j in range(i, len(toks)):
+        t = toks[j]
+        if t == "(":
+            depth += 1
+            if depth == 1:
+                continue
+        elif t == ")":
+            depth -= 1
+            if depth == 0:
+                return args, j + 1
+        elif t == "," and depth == 1:
+            args.append([])
+            continue
+        args[-1].append(t)
+    return None, i
+
+
+def _drop_attributes(toks):
+    # GNU __attribute__((...)) groups would otherwise look like a function
+    # name to the scanner
+    out = []
+    i = 0
+    while i < len(toks):
+        if toks[i] in ("__attribute__", "__attribute") and i + 1 < len(toks) and toks[i + 1] == "(":
+            _, j = _collect_args(toks, i + 1)
+            if j > i + 1:
+                i = j
+                continue
+        out.append(toks[i])
+        i += 1
+    return out
+
+
+def _int(tok: str) -> int:
+    if tok[0] == "'":
+        body = tok[1:-1]
+        return ord(body[-1]) if body else 0
+    t = tok.rstrip("uUlL")
+    if len(t) > 1 and t[0] == "0" and t[1].isdigit():
+        return int(t, 8)
+    return int(t, 0)
+
+
+class _Expr:
+    # #if expression evaluator over expanded tokens; identifiers left after
+    # expansion are 0, as in C
+    def __init__(self, toks):
+        self.toks = toks
+        self.i = 0
+
+    def peek(self):
+        return self.toks[self.i] if self.i < len(self.toks) else None
+
+    def next(self):
+        t = self.peek()
+        self.i += 1
+        return t
+
+    def expect(self, tok):
+        if self.next() != tok:
+            raise ValueError(f"expected {tok}")
+
+    def parse(self, prec: int = 0) -> int:
+        left = self.unary()
+        while True:
+            op = self.peek()
+            if op == "?" and prec == 0:
+                self.next()
+                a = self.parse(0)
+                self.expect(":")
+                b = self.parse(0)
+                left = a if left else b
+                continue
+            p = _BINARY.get(op)
+            if p is None or p <= prec:
+                return left
+            self.next()
+            left = self.apply(op, left, self.parse(p))
+
+    @staticmethod
+    def apply(op, a, b):
+        if op in ("/", "%"):
+            if b == 0:
+                return 0
+            q = abs(a) // abs(b) * (1 if (a < 0) == (b < 0) else -1)
+            return q if op == "/" else a - q * b
+        return {
+            "*": lambda: a * b, "+": lambda: a + b, "-": lambda: a - b,
+            "<<": lambda: a << b if b >= 0 else 0, ">>": lambda: a >> b if b >= 0 else 0,
+            "<": lambda: int(a < b), "<=": lambda: int(a <= b), ">": lambda: int(a > b), ">=": lambda: int(a >= b),
+            "==": lambda: int(a == b), "!=": lambda: int(a != b), "&": lambda: a & b, "^": lambda: a ^ b,
+            "|": lambda: a | b, "&&": lambda: int(bool(a) and bool(b)), "||": lambda: int(bool(a) or bool(b)),
+        }[op]()
+
+    def unary(self) -> int:
+        t = self.next()
+        if t is None:
+            raise ValueError("unexpected end of expression")
+        if t == "(":
+            v = self.parse(0)
+            self.expect(")")
+            return v
+        if t == "!":
+            return int(not self.unary())
+        if t == "-":
+            return -self.unary()
+        if t == "+":
+            return self.unary()
+        if t == "~":
+            return ~self.unary()
+        if t[0].isdigit() or t[0] == "'":
+            return _int(t)
+        if _is_ident(t):
+            return 0
+        raise ValueError(f"unexpected token {t}")
+
+
+class _Unit:
+    # Macro state of one translation unit. While headers are being read,
+    # every lookup and change is also recorded for the header cache.
+    def __init__(self, macros: dict):
+        self.macros = dict(macros)
+        self.deps = {}
+        self.once = set()
+        self.recording = []
+
+    def lookup(self, name):
+        for frame in self.recording:
+            if name not in frame["touched"] and name not in frame["reads"]:
+                frame["reads"][name] = self.macros.get(name)
+        return self.macros.get(name)
+
+    def assign(self, name, macro):
+        for frame in self.recording:
+            frame["touched"].add(name)
+            frame["delta"][name] = macro
+        if macro is None:
+            self.macros.pop(name, None)
+        else:
+            self.macros[name] = macro
+
+    def depend(self, path: str, stat):
+        self.deps[path] = stat
+        for frame in self.recording:
+            frame["deps"][path] = stat
+
+
+class PreprocessResult:
+    def __init__(self, text: str, macros: dict, deps: dict):
+        self.text = text
+        self.macros = macros
+        self.deps = deps
+
+
+class Preprocessor:
+    """Conditional blocks, includes and file-scope macros for scanning.
+
+    ``include_dirs`` are searched for ``#include <...>`` and, after the
+    including file's directory, ``#include "..."``; headers that cannot be
+    found are skipped. ``defines`` are ``-D`` style strings: ``NAME``,
+    ``NAME=value`` or ``NAME(args)=body``.
+    """
+
+    def __init__(self, include_dirs=(), defines=()):
+        self.include_dirs = [str(Path(d).resolve()) for d in include_dirs]
+        self.defines = list(defines)
+        self.base = {}
+        for d in self.defines:
+            name, _, value = d.partition("=")
+            m = _DEFINE_RE.match(name.strip() + " " + (value if _ else "1"))
+            if m:
+                self.base[m.group(1)] = self._macro(m)
+
+    def fingerprint(self) -> str:
+        raw = "\0".join(self.include_dirs) + "\1" + "\0".join(self.defines)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def _macro(m):
+        params = None
+        if m.group(2) is not None:
+            params = tuple(p.strip() for p in m.group(2)[1:-1].split(",") if p.strip())
+        return params, " ".join(_tokens(m.group(3)))
+
+    def run(self, text: str, path) -> PreprocessResult:
+        """Preprocess one translation unit; ``text`` uses ``\\n`` line ends."""
+        unit = _Unit(self.base)
+        raw = text.split("\n")
+        out = self._walk(raw, _strip_comments(text).split("\n"), str(Path(path).resolve()), unit, True)
+        return PreprocessResult("\n".join(out), unit.macros, unit.deps)
+
+    # -- directives -------------------------------------------------------
+
+    def _walk(self, raw, code, path, unit, emit):
+        out = [] if emit else None
+        stack = []  # conditional frames: [parent_active, branch_taken]
+        active = True
+        depth = 0  # file-scope brace depth of active code (emit only)
+        i = 0
+        n = len(code)
+        while i < n:
+            line = code[i]
+            span = 1
+            m = _DIRECTIVE_RE.match(line)
+            if m is None:
+                if emit:
+                    if not active:
+                        out.append("")
+                    elif depth == 0 and self._has_invocation(line, unit):
+                        span = self._expand_lines(raw, code, i, unit, out)
+                    else:
+                        out.append(raw[i])
+                    if active:
+                        for k in range(i, i + span):
+                            stripped = _COMMENT_OR_LITERAL_RE.sub("", code[k])
+                            depth = max(0, depth + stripped.count("{") - stripped.count("}"))
+                i += span
+                continue
+            while line.endswith("\\") and i + span < n:
+                line = line[:-1] + " " + code[i + span]
+                span += 1
+            m = _DIRECTIVE_RE.match(line)
+            name, rest = m.group(1) or "", m.group(2).strip()
+            keep = True
+            if name in ("if", "ifdef", "ifndef"):
+                cond = False
+                if active:
+                    if name == "if":
+                        cond = self._eval(rest, unit)
+                    else:
+                        defined = bool(rest) and unit.lookup(_tokens(rest)[0]) is not None
+                        cond = defined if name == "ifdef" else not defined
+                stack.append([active, cond])
+                active = active and cond
+            elif name == "elif":
+                if stack:
+                    frame = stack[-1]
+                    active = frame[0] and not frame[1] and self._eval(rest, unit)
+                    frame[1] = frame[1] or active
+            elif name == "else":
+                if stack:
+                    frame = stack[-1]
+                    active = frame[0] and not frame[1]
+                    frame[1] = True
+            elif name == "endif":
+                if stack:
+                    active = stack.pop()[0]
+            elif not active:
+                keep = False
+            elif name == "define":
+                dm = _DEFINE_RE.match(rest)
+                if dm:
+                    unit.assign(dm.group(1), self._macro(dm))
+            elif name == "undef":
+                if rest:
+                    unit.assign(_tokens(rest)[0], None)
+            elif name == "include":
+                self._include(rest, path, unit)
+            elif name == "pragma" and rest.split()[:1] == ["once"]:
+                unit.once.add(path)
+            if emit:
+                out.extend(raw[i:i + span] if keep else [""] * span)
+            i += span
+        return out
+
+    def _eval(self, expr: str, unit) -> bool:
+        toks = _tokens(expr)
+        resolved = []
+        i = 0
+        while i < len(toks):
+            if toks[i] == "defined":
+                if i + 1 < len(toks) and toks[i + 1] == "(":
+                    name = toks[i + 2] if i + 2 < len(toks) else ""
+                    i += 4
+                else:
+                    name = toks[i + 1] if i + 1 < len(toks) else ""
+                    i += 2
+                resolved.append("1" if unit.lookup(name) is not None else "0")
+                continue
+            resolved.append(toks[i])
+            i += 1
+        try:
+            return bool(_Expr(self._expand(resolved, unit)).parse())
+        except (ValueError, KeyError, IndexError):
+            return False
+
+    # -- includes ---------------------------------------------------------
+
+    def _find(self, target: str, quoted: bool, including: str):
+        dirs = ([os.path.dirname(including)] if quoted else []) + self.include_dirs
+        for d in dirs:
+            candidate = os.path.normpath(os.path.join(d, target))
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def _include(self, rest: str, including: str, unit):
+        m = _INCLUDE_RE.match(rest)
+        if m is None:
+            # #include MACRO
+            m = _INCLUDE_RE.match("".join(self._expand(_tokens(rest), unit)))
+            if m is None:
+                return
+        path = self._find(m.group(1) or m.group(2), m.group(1) is not None, including)
+        if path is None or path in unit.once:
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        stat = [st.st_mtime_ns, st.st_size]
+        entry = _HEADER_CACHE.get(path)
+        if entry is None or entry["stat"] != stat:
+            text = Path(path).read_text(encoding="utf-8", errors="ignore")
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+            entry = {"stat": stat, "raw": text.split("\n"), "code": _strip_comments(text).split("\n"),
+                     "variants": []}
+            _HEADER_CACHE[path] = entry
+        unit.depend(path, stat)
+        for variant in entry["variants"]:
+            if all(unit.macros.get(k) == v for k, v in variant["reads"].items()):
+                for k in variant["reads"]:
+                    unit.lookup(k)
+                for k, v in variant["delta"].items():
+                    unit.assign(k, v)
+                for dep, dep_stat in variant["deps"].items():
+                    unit.depend(dep, dep_stat)
+                if variant["once"]:
+                    unit.once.add(path)
+                return
+        if len(unit.recording) > 64:
+            return  # runaway recursive includes
+        frame = {"reads": {}, "touched": set(), "delta": {}, "deps": {}}
+        unit.recording.append(frame)
+        try:
+            self._walk(entry["raw"], entry["code"], path, unit, False)
+        finally:
+            unit.recording.pop()
+        frame["once"] = path in unit.once
+        del frame["touched"]
+        entry["variants"].append(frame)
+        for outer in unit.recording:
+            for k, v in frame["reads"].items():
+                if k not in outer["touched"] and k not in outer["reads"]:
+                    outer["reads"][k] = v
+
+    # -- macro expansion --------------------------------------------------
+
+    def _has_invocation(self, line: str, unit) -> bool:
+        return any(unit.macros.get(t, (None,))[0] is not None for t in _IDENT_RE.findall(line))
+
+    def _expand_lines(self, raw, code, i, unit, out) -> int:
+        # Expand a file-scope line holding a function-like macro call; lines
+        # its arguments continue onto are blanked. Returns the lines consumed.
+        span = 1
+        toks = _tokens(code[i])
+        while toks.count("(") > toks.count(")") and i + span < len(code) and span < 64:
+            toks += _tokens(code[i + span])
+            span += 1
+        out.append(" ".join(_drop_attributes(self._expand(toks, unit))))
+        out.extend([""] * (span - 1))
+        return span
+
+    def invoked_macros(self, text: str, macros: dict) -> dict:
+        """``{macro: functions the call expands to}`` for macros ``text`` calls.
+
+        ``macros`` is the final table of the translation unit. Each call is
+        expanded with its own arguments, so ``module_init(setup)`` maps to
+        ``setup`` and an object-like alias (``#define my_alloc kmalloc``) to
+        its target. Macros in the declarator, before the body, map to no
+        functions: they shape the definition rather than call anything.
+        """
+        code = _strip_comments(text)
+        brace = code.find("{")
+        found = {}
+        if brace >= 0:
+            for t in _IDENT_RE.findall(code[:brace]):
+                if t in macros:
+                    found[t] = []
+            code = code[brace + 1:]
+        toks = _tokens(code)
+        unit = _Unit(macros)
+        for i in range(len(toks) - 1):
+            t = toks[i]
+            if toks[i + 1] != "(" or t not in macros:
+                continue
+            if macros[t][0] is None:
+                call = [t, "(", ")"]
+            else:
+                args, j = _collect_args(toks, i + 1)
+                if args is None:
+                    continue
+                call = toks[i:j]
+            expanded = _drop_attributes(self._expand(call, unit))
+            callees = found.setdefault(t, [])
+            for k in range(len(expanded) - 1):
+                name = expanded[k]
+                if (expanded[k + 1] == "(" and _is_ident(name) and name not in _NOT_CALLS
+                        and name not in macros and name not in callees):
+                    callees.append(name)
+        return found
+
+    def _expand(self, toks, unit, disabled=frozenset()):
+        out = []
+        i = 0
+        while i < len(toks):
+            t = toks[i]
+            macro = unit.lookup(t) if _is_ident(t) and t not in disabled else None
+            if macro is None:
+                out.append(t)
+                i += 1
+                continue
+            params, body = macro
+            inner = disabled | {t}
+            if params is None:
+                out.extend(self._expand(_tokens(body), unit, inner))
+                i += 1
+                continue
+            if i + 1 >= len(toks) or toks[i + 1] != "(":
+                out.append(t)
+                i += 1
+                continue
+            args, j = _collect_args(toks, i + 1)
+            if args is None:
+                out.append(t)
+                i += 1
+                continue
+            out.extend(self._expand(self._substitute(params, body, args, unit, inner), unit, inner))
+            i = j
+        return out
+
+    def _substitute(self, params, body, args, unit, disabled):
+        names = list(params)
+        if names and names[-1].endswith("..."):
+            # "..." binds __VA_ARGS__, "args..." (GNU) binds args
+            va = names[-1][:-3].strip() or "__VA_ARGS__"
+            names[-1] = va
+            fixed = len(names) - 1
+            rest = []
+            for k, a in enumerate(args[fixed:]):
+                if k:
+                    rest.append(",")
+                rest.extend(a)
+            args = args[:fixed] + [rest]
+        bind = {name: (args[k] if k < len(args) else []) for k, name in enumerate(names)}
+        btoks = _tokens(body)
+        out = []
+        k = 0
+        while k < len(btoks):
+            t = btoks[k]
+            if t == "#" and k + 1 < len(btoks) and btoks[k + 1] in bind:
+                s = " ".join(bind[btoks[k + 1]]).replace("\\", "\\\\").replace('"', '\\"')
+                out.append('"' + s + '"')
+                k += 2
+                continue
+            if t == "##" and k + 1 < len(btoks):
+                nxt = btoks[k + 1]
+                right = bind[nxt] if nxt in bind else [nxt]
+                if right and out:
+                    out[-1] += right[0]
+                    out.extend(right[1:])
+                elif not right and out and out[-1] == ",":
+                    out.pop()  # GNU: ", ## __VA_ARGS__" drops the comma when empty
+                else:
+                    out.extend(right)
+                k += 2
+                continue
+            if t in bind:
+                pasted = k + 1 < len(btoks) and btoks[k + 1] == "##"
+                out.extend(bind[t] if pasted else self._expand(bind[t], unit, disabled))
+                k += 1
+                continue
+            out.append(t)
+            k += 1
+        return out
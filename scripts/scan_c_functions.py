@@ -2,84 +2,291 @@ import re
 import json
 from pathlib import Path
 
-def find_matching_brace(s, start):
-    i = start + 1
+# Single-pass C lexer. At file scope every token matters (declarations are
+# matched token by token); inside a braced block only braces are relevant, so
+# the body pattern skips identifiers and operators entirely. A preprocessor
+# line runs to the end of the line, continuation lines and any block comment
+# it opens included.
+_TOP_LEVEL_RE = re.compile(r"""
+    (?P<comment>/\*.*?(?:\*/|\Z)|//[^\n]*)
+  | (?P<pp>^[ \t]*\#(?:\\\r?\n|/\*.*?(?:\*/|\Z)|[^\n])*)
+  | (?P<literal>"(?:\\.|[^"\\])*"?|'(?:\\.|[^'\\])*'?)
+  | (?P<ident>[A-Za-z_]\w*)
+  | (?P<punct>[{}();*,])
+  | (?P<other>\d\w*|[^\s\w{}();*,"'/\#]+|[/\#])
+""", re.MULTILINE | re.DOTALL | re.VERBOSE)
+
+_BODY_RE = re.compile(r"""
+    /\*.*?(?:\*/|\Z)|//[^\n]*
+  | ^[ \t]*\#(?:\\\r?\n|/\*.*?(?:\*/|\Z)|[^\n])*
+  | "(?:\\.|[^"\\])*"?|'(?:\\.|[^'\\])*'?
+  | [{}]
+""", re.MULTILINE | re.DOTALL | re.VERBOSE)
+
+_DIRECTIVE_RE = re.compile(r"[ \t]*\#[ \t]*(\w+)")
+_NON_FUNCTION_NAMES = {"if", "for", "while", "switch", "do"}
+# Words that introduce a (...) group after a declarator without naming it
+_ATTRIBUTE_WORDS = {"__attribute__", "__attribute", "__declspec", "__asm__", "__asm", "asm"}
+
+
+def _decl_start(text, stmt_start, name_pos):
+    # From the beginning of the line holding the first declaration token,
+    # except that a name at column 0 starts its own line: the return type
+    # then sits on the line(s) above (static int\nfoo(void)) and, as with
+    # the original regex scanner, is not part of the function text
+    if name_pos > 0 and text[name_pos - 1] == '\n':
+        return name_pos
+    bol = text.rfind('\n', 0, stmt_start) + 1
+    return bol if not text[bol:stmt_start].strip() else stmt_start
+
+
+def skip_block(text, start):
+    """Return the index of the brace closing the block opened at text[start].
+
+    Comments, string/char literals and preprocessor lines are skipped. Only
+    the first branch of an #if/#elif/#else chain is counted, so alternative
+    headers or conditions that each open a brace stay balanced; a chain that
+    began before the block counts too. An unterminated block runs to the end
+    of the text (the last index is returned).
+    """
     level = 1
-    in_str = False
-    in_char = False
-    in_block_comment = False
-    in_line_comment = False
-    while i < len(s):
-        c = s[i]
-        if in_block_comment:
-            if c == '*' and i + 1 < len(s) and s[i + 1] == '/':
-                in_block_comment = False
-                i += 2
+    pos = start + 1
+    search = _BODY_RE.search
+    conds = []  # per #if opened inside the block: in a later branch
+    outer_else = False  # in a later branch of a chain opened before the block
+    skipping = 0
+    while True:
+        m = search(text, pos)
+        if m is None:
+            return len(text) - 1
+        tok = m.group()
+        pos = m.end()
+        if tok == '{':
+            if not skipping:
+                level += 1
+        elif tok == '}':
+            if not skipping:
+                level -= 1
+                if level == 0:
+                    return m.start()
+        elif tok[0] in '# \t':
+            d = _DIRECTIVE_RE.match(tok)
+            word = d.group(1) if d else ''
+            if word in ('if', 'ifdef', 'ifndef'):
+                conds.append(False)
+            elif word in ('elif', 'else'):
+                if conds:
+                    conds[-1] = True
+                else:
+                    outer_else = True
+            elif word == 'endif':
+                if conds:
+                    conds.pop()
+                else:
+                    outer_else = False
+            else:
                 continue
-            i += 1
-            continue
-        if in_line_comment:
-            if c == '\n':
-                in_line_comment = False
-            i += 1
-            continue
-        if in_str:
-            if c == '\\':
-                i += 2
-                continue
-            if c == '"':
-                in_str = False
-            i += 1
+            skipping = outer_else or any(conds)
+
+
+def iter_declarations(text):
+    """Yield (name, line, start, end, is_static, is_definition) for each
+    function definition and file-scope function prototype in text.
+
+    ``text[start:end]`` is the full declaration: from the beginning of the line
+    holding the first declaration token (or of the name's line when the name
+    starts a line) through the closing brace (or ``;``). ``is_static`` is set
+    when ``static`` precedes the name. A prototype needs at least one type
+    token before its name, so file-scope macro invocations such as
+    ``module_init(f);`` are not reported. A ``(...)`` group followed by more
+    identifiers and another group is a prefix (``__attribute__((noreturn))
+    void die(...)``, ``static __printf(2, 3) int log_it(...)``); the name is
+    the identifier before the last group.
+    """
+    search = _TOP_LEVEL_RE.search
+    pos = 0
+    line = 1
+    line_pos = 0
+    # Per-declaration state, reset at ';', '}' and preprocessor lines
+    stmt_start = None
+    prev_ident = None
+    prev_pos = 0
+    name = None
+    name_pos = 0
+    valid = True
+    paren_depth = 0
+    params_closed = False
+    is_static = False
+    typed = False
+    linkage = False
+    while True:
+        m = search(text, pos)
+        if m is None:
+            return
+        kind = m.lastgroup
+        tok = m.group()
+        pos = m.end()
+        if kind == 'comment':
             continue
-        if in_char:
-            if c == '\\':
-                i += 2
+        if kind == 'pp':
+            if name is not None and (paren_depth > 0 or params_closed):
+                # #if/#else inside a parameter list or between it and the
+                # body: both branches are read
                 continue
-            if c == '\'':
-                in_char = False
-            i += 1
+            stmt_start = prev_ident = name = None
+            valid = True
+            params_closed = is_static = typed = linkage = False
             continue
-        if c == '/' and i + 1 < len(s):
-            d = s[i + 1]
-            if d == '*':
-                in_block_comment = True
-                i += 2
+        if tok == '{':
+            if linkage:
+                # extern "C" { ... }: the block holds ordinary declarations
+                stmt_start = prev_ident = name = None
+                params_closed = is_static = typed = linkage = False
                 continue
-            if d == '/':
-                in_line_comment = True
-                i += 2
+            if valid and name is not None and params_closed and name not in _NON_FUNCTION_NAMES:
+                end = skip_block(text, m.start())
+                start = _decl_start(text, stmt_start, name_pos)
+                line += text.count('\n', line_pos, start)
+                line_pos = start
+                yield name, line, start, end + 1, is_static, True
+                pos = end + 1
+                stmt_start = prev_ident = name = None
+                params_closed = is_static = typed = linkage = False
                 continue
-        if c == '"':
-            in_str = True
-            i += 1
+            # struct/union/enum bodies and initializers are not functions
+            pos = skip_block(text, m.start()) + 1
+            valid = False
+            params_closed = False
             continue
-        if c == '\'':
-            in_char = True
-            i += 1
+        if tok in (';', '}'):
+            if (tok == ';' and valid and typed and name and params_closed
+                    and name not in _NON_FUNCTION_NAMES):
+                start = _decl_start(text, stmt_start, name_pos)
+                line += text.count('\n', line_pos, start)
+                line_pos = start
+                yield name, line, start, m.end(), is_static, False
+            stmt_start = prev_ident = name = None
+            valid = True
+            params_closed = is_static = typed = linkage = False
             continue
-        if c == '{':
-            level += 1
-        elif c == '}':
-            level -= 1
-            if level == 0:
-                return i
-        i += 1
-    return len(s) - 1
+        if stmt_start is None:
+            stmt_start = m.start()
+        if name is None:
+            if kind == 'literal' and prev_ident == 'extern':
+                linkage = True
+                continue
+            if kind == 'ident':
+                if prev_ident is not None:
+                    typed = True
+                if tok == 'static':
+                    is_static = True
+                prev_ident, prev_pos = tok, m.start()
+                continue
+            if tok == '(':
+                if prev_ident is None:
+                    valid = False
+                name, name_pos = prev_ident or '', prev_pos
+                paren_depth = 1
+            elif tok == '*':
+                typed = True
+            elif kind != 'punct':
+                valid = False
+            prev_ident = None
+        elif paren_depth > 0:
+            if tok == '(':
+                paren_depth += 1
+            elif tok == ')':
+                paren_depth -= 1
+                params_closed = paren_depth == 0
+        elif kind == 'ident':
+            # After a closed group: a trailing attribute (f(void) __THROW;)
+            # or, if another group follows, the real declarator
+            if tok == 'static':
+                is_static = True
+            if tok not in _ATTRIBUTE_WORDS:
+                prev_ident, prev_pos = tok, m.start()
+                typed = True
+        elif tok == '(':
+            if prev_ident is not None:
+                name, name_pos = prev_ident, prev_pos
+                prev_ident = None
+            paren_depth = 1
+            params_closed = False
+        else:
+            params_closed = False
+            prev_ident = None
+
+
+def iter_functions(text):
+    """Yield (name, line, start, end) for each function definition in text.
+
+    ``text[start:end]`` is the full definition, delimited as in
+    iter_declarations.
+    """
+    for name, line, start, end, _, is_definition in iter_declarations(text):
+        if is_definition:
+            yield name, line, start, end
+
+
+_INCLUDE_RE = re.compile(r'^[ \t]*\#[ \t]*include[ \t]*[<"]([^>"\n]+)[>"]', re.MULTILINE)
+
+
+def _source_span(text, source_lines, line_starts, line, start, end):
+    # Map [start, end) of text to source, which has the same lines; columns
+    # only carry over on lines the preprocessor left unchanged
+    first = line - 1
+    last = min(first + text.count('\n', start, end), len(source_lines) - 1)
+
+    def text_line(pos):
+        s = text.rfind('\n', 0, pos) + 1
+        e = text.find('\n', pos)
+        return s, text[s:len(text) if e == -1 else e]
+
+    s0, l0 = text_line(start)
+    s1, l1 = text_line(end - 1)
+    lo = start - s0 if l0 == source_lines[first] else 0
+    hi = end - s1 if l1 == source_lines[last] else len(source_lines[last])
+    return line_starts[first] + lo, line_starts[last] + hi
+
+
+def extract_symbols(text, source=None):
+    """Function definitions plus the linkage facts the symbol table needs.
+
+    Returns ``(functions, symbols)``: ``functions`` as ``(name, line, start,
+    end)``, where ``start:end`` delimits the definition in ``text``, and
+    ``symbols`` with the names this file gives internal linkage (``static``
+    definitions or prototypes), the names of its other prototypes and its
+    ``#include`` targets. When ``text`` is preprocessed output with the line
+    layout of ``source``, the offsets point into ``source`` instead.
+    """
+    functions = []
+    static = set()
+    prototypes = set()
+    if source is not None:
+        source_lines = source.split('\n')
+        line_starts = [0]
+        for l in source_lines:
+            line_starts.append(line_starts[-1] + len(l) + 1)
+    for name, line, start, end, is_static, is_definition in iter_declarations(text):
+        if is_definition:
+            if source is None:
+                functions.append((name, line, start, end))
+            else:
+                functions.append((name, line) + _source_span(text, source_lines, line_starts, line, start, end))
+        if is_static:
+            static.add(name)
+        elif not is_definition:
+            prototypes.add(name)
+    symbols = {
+        "static": sorted(static),
+        "prototypes": sorted(prototypes - static),
+        "includes": _INCLUDE_RE.findall(text),
+    }
+    return functions, symbols
+
 
 def extract_functions_from_text(text):
-    pattern = re.compile(r"^[ \t]*(?:[A-Za-z_][\w\s\*\(\),]*?[ \t\*])?([A-Za-z_]\w*)\s*\([^;]*\)[ \t\r\n]*\{", re.MULTILINE | re.DOTALL)
-    results = []
-    for m in pattern.finditer(text):
-        name = m.group(1)
-        if name in {"if", "for", "while", "switch", "do"}:
-            continue
-        start_pos = m.start()
-        line = text.count('\n', 0, start_pos) + 1
-        brace_index = m.end() - 1
-        end_pos = find_matching_brace(text, brace_index)
-        func_text = text[start_pos:end_pos + 1]
-        results.append((name, line, func_text))
-    return results
+    return [(name, line, text[start:end]) for name, line, start, end in iter_functions(text)]
 
 def main():
     root = Path(__file__).resolve().parent.parent
@@ -0,0 +1,119 @@
+import posixpath
+from collections import defaultdict
+
+# Cross-file function resolution for the call graph. Every scanned .c file is
+# one translation unit (TU); headers only contribute prototypes and includes.
+# A call resolves, in order, to:
+#   1. a definition in the caller's own TU (static or not),
+#   2. the only definition with external linkage anywhere,
+#   3. among several external definitions, those implementing a header the
+#      caller sees that declares the name (the defining file includes that
+#      header or shares its stem, foo.c/foo.h), then those in the caller's
+#      directory.
+# Static definitions in other TUs are never candidates, so a call that only
+# matches those is external.
+
+
+def _norm(path: str) -> str:
+    return path.replace("\\", "/")
+
+
+def _stem(path: str) -> str:
+    return posixpath.splitext(posixpath.basename(path))[0]
+
+
+class SymbolTable:
+    """Function symbols by translation unit, built from scan index entries.
+
+    ``files`` maps root-relative paths to entries with ``functions``
+    (``[name, line, text]``, plus a macro map when preprocessed) and ``symbols`` (see
+    ``scripts.scan_c_functions.extract_symbols``).
+    """
+
+    def __init__(self, files: dict):
+        self.defined = {}  # TU -> names defined there
+        self.external = defaultdict(list)  # name -> TUs defining it with external linkage
+        self.prototypes = {}  # header -> declared names
+        self.includes = {}  # file -> include targets
+        self.static_count = 0
+        for rel, entry in files.items():
+            rel = _norm(rel)
+            symbols = entry.get("symbols") or {}
+            self.includes[rel] = symbols.get("includes", [])
+            if rel.endswith(".h"):
+                self.prototypes[rel] = set(symbols.get("prototypes", ())) | set(symbols.get("static", ()))
+                continue
+            static = set(symbols.get("static", ()))
+            names = {f[0] for f in entry.get("functions") or ()}
+            self.defined[rel] = names
+            self.static_count += len(names & static)
+            for name in sorted(names - static):
+                self.external[name].append(rel)
+        self.headers_by_name = defaultdict(list)
+        for h in self.prototypes:
+            self.headers_by_name[posixpath.basename(h)].append(h)
+        self._visible = {}
+        self._resolved = {}
+        self.stats = {"unique": 0, "ambiguous": 0, "external": 0}
+
+    def summary(self) -> str:
+        defs = sum(len(names) for names in self.defined.values())
+        protos = sum(len(names) for names in self.prototypes.values())
+        s = self.stats
+        return (f"Symbols: {defs} definitions ({self.static_count} static) in {len(self.defined)} files, "
+                f"{protos} prototypes in {len(self.prototypes)} headers; callee lookups: "
+                f"{s['unique']} unique, {s['ambiguous']} ambiguous, {s['external']} external")
+
+    def _find_headers(self, including: str, target: str):
+        # Relative to the including file first, else any scanned header whose
+        # path ends with the include target (covers -I style include roots)
+        near = posixpath.normpath(posixpath.join(posixpath.dirname(including), target))
+        if near in self.prototypes:
+            return [near]
+        return [h for h in self.headers_by_name.get(posixpath.basename(target), ())
+                if h == target or h.endswith("/" + target)]
+
+    def visible_headers(self, rel: str) -> set:
+        """Headers included by ``rel``, directly or transitively."""
+        seen = self._visible.get(rel)
+        if seen is None:
+            seen = set()
+            stack = [rel]
+            while stack:
+                f = stack.pop()
+                for target in self.includes.get(f, ()):
+                    for h in self._find_headers(f, target):
+                        if h not in seen:
+                            seen.add(h)
+                            stack.append(h)
+            self._visible[rel] = seen
+        return seen
+
+    def resolve(self, file: str, name: str):
+        """Files whose definition of ``name`` a call from ``file`` can reach.
+
+        Returns an empty list when no scanned definition is reachable (an
+        external call) and None when ``file`` is not a known TU, in which
+        case callers fall back to linking by name.
+        """
+        file = _norm(file)
+        key = (file, name)
+        if key in self._resolved:
+            return self._resolved[key]
+        if file not in self.defined:
+            return None
+        if name in self.defined[file]:
+            found = [file]
+        else:
+            found = self.external.get(name, [])
+            if len(found) > 1:
+                declaring = [h for h in self.visible_headers(file) if name in self.prototypes[h]]
+                implementing = [d for d in found
+                                if any(h in self.visible_headers(d) or _stem(h) == _stem(d) for h in declaring)]
+                found = implementing or found
+            if len(found) > 1:
+                here = posixpath.dirname(file)
+                found = [d for d in found if posixpath.dirname(d) == here] or found
+        self.stats["unique" if len(found) == 1 else "ambiguous" if found else "external"] += 1
+        self._resolved[key] = found
+        return found
@@ -1,32 +1,302 @@
+import base64
+import filecmp
+import gzip
 import json
 import os
+import re
+import shutil
 from pathlib import Path
 
-def generate_report(json_path: str, output_path: str):
+try:
+    from visualization.layout import layered_layout
+except ImportError:
+    from layout import layered_layout
+
+def build_graph(data, symbols=None):
+    """Resolve call edges by callee name so the report does index lookups.
+
+    Returns node ids (``data`` order, then one external node per unresolved
+    callee), per-node ``callees`` as ``[call_index, target_index]`` pairs and
+    per-node ``callers`` as ``[source_index, call_index]`` pairs. With
+    ``symbols`` (a ``scripts.symbol_table.SymbolTable``), calls link only to
+    the definitions the caller's translation unit can reach instead of every
+    function with the callee's name.
+    """
+    by_name = {}
+    by_def = {}
+    for i, item in enumerate(data):
+        by_name.setdefault(item["function_name"], []).append(i)
+        by_def.setdefault((item["file_path"].replace("\\", "/"), item["function_name"]), []).append(i)
+    ids = [f"{item['file_path']}::{item['function_name']}" for item in data]
+    ghosts = []
+    ghost_index = {}
+    callees = []
+    callers = [[] for _ in data]
+    for i, item in enumerate(data):
+        out = []
+        for k, call in enumerate(item.get("calls") or []):
+            callee = call.get("callee")
+            targets = by_name.get(callee)
+            if targets and symbols is not None:
+                files = symbols.resolve(item["file_path"], callee)
+                if files is not None:
+                    targets = [j for f in files for j in by_def.get((f, callee), ())]
+            if not targets:
+                t = ghost_index.get(callee)
+                if t is None:
+                    t = len(ids)
+                    ghost_index[callee] = t
+                    ghosts.append(callee)
+                    ids.append(f"external::{callee}")
+                    callers.append([])
+                targets = (t,)
+            for t in targets:
+                out.append([k, t])
+                callers[t].append([i, k])
+        callees.append(out)
+    return {"ids": ids, "ghosts": ghosts, "callees": callees, "callers": callers}
+
+def build_hierarchy(graph: dict, file_paths):
+    """Directory -> file clusters over a build_graph result.
+
+    Returns ``clusters`` as ``[name, parent, kind]`` (kind 0 = directory,
+    1 = file; parents come before children, -1 is the top level), the file
+    cluster of every node (external nodes share one pseudo-file) and
+    ``fileEdges`` as ``[source_file, target_file, weight]`` call counts.
+    Directory chains with a single subdirectory are merged into one cluster.
+    """
+    tree = {}
+    for fp in file_paths:
+        parts = fp.replace("\\", "/").split("/")
+        node = tree
+        for d in parts[:-1]:
+            node = node.setdefault(("d", d), {})
+        node.setdefault(("f", parts[-1]), {})
+    clusters = []
+    file_index = {}
+
+    def add(children, parent, prefix):
+        for (kind, name), sub in sorted(children.items(), key=lambda kv: (kv[0][0] == "f", kv[0][1])):
+            label = name
+            while kind == "d" and len(sub) == 1 and next(iter(sub))[0] == "d":
+                (_, child), = sub.keys()
+                label += "/" + child
+                sub = sub[("d", child)]
+            c = len(clusters)
+            clusters.append([label, parent, 0 if kind == "d" else 1])
+            path = f"{prefix}{label}"
+            if kind == "f":
+                file_index[path] = c
+            else:
+                add(sub, c, path + "/")
+
+    add(tree, -1, "")
+    node_cluster = [file_index[fp.replace("\\", "/")] for fp in file_paths]
+    if graph["ghosts"]:
+        ext = len(clusters)
+        clusters.append(["(external)", -1, 1])
+        node_cluster += [ext] * len(graph["ghosts"])
+    weights = {}
+    for i, outs in enumerate(graph["callees"]):
+        for _, t in outs:
+            a, b = node_cluster[i], node_cluster[t]
+            if a != b:
+                weights[(a, b)] = weights.get((a, b), 0) + 1
+    file_edges = [[a, b, w] for (a, b), w in sorted(weights.items())]
+    return {"clusters": clusters, "nodeCluster": node_cluster, "fileEdges": file_edges}
+
+def build_search_index(names):
+    """Name search index for the report sidebar.
+
+    ``count`` is the number of names indexed (the report's functions, not
+    its external nodes); ``trigrams`` maps every lower-cased trigram to the ascending indices of
+    the names containing it, delta-encoded. Terms of three or more
+    characters intersect the postings of their trigrams and check the few
+    candidates left; shorter terms are matched by a linear scan of the names.
+    """
+    lower = [name.lower() for name in names]
+    trigrams = {}
+    last = {}
+    for i, name in enumerate(lower):
+        for gram in {name[k:k + 3] for k in range(len(name) - 2)}:
+            trigrams.setdefault(gram, []).append(i - last.get(gram, 0))
+            last[gram] = i
+    return {"count": len(lower), "trigrams": trigrams}
+
+class BodyChunks:
+    """Function bodies for compact reports, written beside the HTML.
+
+    Bodies are grouped into chunks of roughly ``chunk_bytes``; each chunk is a
+    small script holding a gzipped, base64-encoded JSON array, which the
+    report loads and decodes only when a function is opened. Script files
+    (unlike fetch) also load from file:// URLs.
+    """
+
+    def __init__(self, directory, chunk_bytes: int = 512 * 1024):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        for old in self.dir.glob("*.js"):
+            old.unlink()
+        self.chunk_bytes = chunk_bytes
+        self.index = 0
+        self.bodies = []
+        self.size = 0
+
+    def add(self, body: str):
+        # Returns [chunk, position] for the record's "body" field
+        ref = [self.index, len(self.bodies)]
+        self.bodies.append(body)
+        self.size += len(body)
+        if self.size >= self.chunk_bytes:
+            self.flush()
+        return ref
+
+    def flush(self):
+        if not self.bodies:
+            return
+        raw = json.dumps(self.bodies, ensure_ascii=False).encode("utf-8")
+        blob = base64.b64encode(gzip.compress(raw, mtime=0)).decode("ascii")
+        (self.dir / f"{self.index:05d}.js").write_text(
+            f'canalysisBodyChunk({self.index}, "{blob}");\n', encoding="utf-8"
+        )
+        self.index += 1
+        self.bodies = []
+        self.size = 0
+
+def iter_ndjson(path: str):
+    with open(path, 'r', encoding='utf-8') as src:
+        for line in src:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def script_json(value, separators=None) -> str:
+    # JSON that is safe inside <script>: "</" would end the element early
+    return json.dumps(value, ensure_ascii=False, separators=separators).replace("</", "<\\/")
+
+LIBS = {
+    "<!-- CYTOSCAPE_LIB -->": "cytoscape.min.js",
+    "<!-- DAGRE_LIB -->": "dagre.min.js",
+    "<!-- CYTOSCAPE_DAGRE_LIB -->": "cytoscape-dagre.min.js",
+}
+SLOT_RE = re.compile("(" + "|".join(map(re.escape, LIBS)) + "|DATA_PLACEHOLDER|GRAPH_PLACEHOLDER|BODIES_PLACEHOLDER|SEARCH_INDEX_PLACEHOLDER)")
+
+def find_libs_dir(output_path: str) -> Path:
+    # libs/ next to the report, else the copy shipped with this module
+    local = Path(output_path).parent / "libs"
+    return local if local.is_dir() else Path(__file__).resolve().parent / "libs"
+
+def publish_assets(libs_dir: Path, assets_dir) -> Path:
+    """Copy the libraries into a shared assets directory once; returns it."""
+    assets = Path(assets_dir)
+    assets.mkdir(parents=True, exist_ok=True)
+    for name in LIBS.values():
+        src, dst = libs_dir / name, assets / name
+        if not src.exists() or src.resolve() == dst.resolve():
+            continue
+        # Compared by content: an updated library may keep the same size
+        if not dst.exists() or not filecmp.cmp(src, dst, shallow=False):
+            shutil.copyfile(src, dst)
+    return assets
+
+def write_lib(out, slot: str, libs_dir: Path, assets: Path, output_path: str):
+    name = LIBS[slot]
+    if assets is not None:
+        src = os.path.relpath(assets / name, Path(output_path).parent).replace(os.sep, "/")
+        out.write(f'<script src="{src}"></script>')
+        return
+    out.write("<script>\n")
+    try:
+        with open(libs_dir / name, "r", encoding="utf-8") as f:
+            shutil.copyfileobj(f, out)
+    except OSError as e:
+        print(f"Warning: Could not read local library {name}: {e}. Report may not work offline.")
+    out.write("\n</script>")
+
+def add_layout(graph: dict, names):
+    """Attach precomputed node positions (``graph["positions"]``) to a build_graph result."""
+    labels = list(names) + graph["ghosts"]
+    edges = [(i, t) for i, outs in enumerate(graph["callees"]) for _, t in outs]
+    graph["positions"] = layered_layout(labels, edges)
+    return graph
+
+def write_report_stream(html_template: str, records, output_path: str, bodies: BodyChunks = None,
+                        libs_dir: Path = None, assets: Path = None, layout: bool = False,
+                        hierarchy: bool = False, symbols=None):
+    """Write the report in one pass over the template.
+
+    Libraries are copied in from disk (or referenced from ``assets``) and
+    records are written one at a time into rawData; only the fields
+    build_graph needs are kept in memory. With ``bodies``, each record's
+    content moves to the side chunks and the record keeps a ``body``
+    reference instead. With ``layout``, node positions for the global view
+    are computed here rather than by Dagre in the browser; with
+    ``hierarchy``, the global view starts from directory/file clusters.
+    ``symbols`` is passed on to build_graph.
+    """
+    meta = []
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for piece in SLOT_RE.split(html_template):
+            if piece in LIBS:
+                write_lib(out, piece, libs_dir, assets, output_path)
+            elif piece == "DATA_PLACEHOLDER":
+                out.write("[")
+                for rec in records:
+                    meta.append({
+                        "file_path": rec["file_path"],
+                        "function_name": rec["function_name"],
+                        "calls": rec.get("calls") or [],
+                    })
+                    if bodies is not None:
+                        rec = dict(rec)
+                        rec["body"] = bodies.add(rec.pop("content", "") or "")
+                    if len(meta) > 1:
+                        out.write(", ")
+                    out.write(script_json(rec))
+                out.write("]")
+            elif piece == "GRAPH_PLACEHOLDER":
+                graph = build_graph(meta, symbols)
+                if layout:
+                    add_layout(graph, (m["function_name"] for m in meta))
+                if hierarchy:
+                    graph["hierarchy"] = build_hierarchy(graph, [m["file_path"] for m in meta])
+                out.write(script_json(graph, (",", ":")))
+            elif piece == "SEARCH_INDEX_PLACEHOLDER":
+                index = build_search_index(m["function_name"] for m in meta)
+                out.write(script_json(index, (",", ":")))
+            elif piece == "BODIES_PLACEHOLDER":
+                if bodies is not None:
+                    bodies.flush()
+                    rel = os.path.relpath(bodies.dir, Path(output_path).parent).replace(os.sep, "/")
+                    out.write(script_json(rel))
+                else:
+                    out.write("null")
+            else:
+                out.write(piece)
+
+def generate_report(json_path: str, output_path: str, compact: bool = False, assets_dir=None,
+                    layout: bool = False, hierarchy: bool = False, symbols=None):
+    # compact=True keeps function bodies out of the HTML (see BodyChunks);
+    # assets_dir references shared library copies instead of inlining them;
+    # layout=True precomputes global-view positions (see visualization/layout.py);
+    # hierarchy=True makes the global view expandable clusters (see build_hierarchy);
+    # symbols resolves calls by linkage and includes (see scripts/symbol_table.py)
     print(f"Generating report from {json_path} to {output_path}")
-    # Read the analysis data
+    # Read the analysis data; NDJSON input is streamed while writing
+    stream = json_path.endswith(".ndjson")
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if stream:
+            if not os.path.exists(json_path):
+                raise FileNotFoundError(json_path)
+        else:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
     except FileNotFoundError:
         print(f"Error: Could not find {json_path}")
         return
     
-    # Load libraries
-    libs_dir = Path(output_path).parent / "libs"
-    cytoscape_js = ""
-    dagre_js = ""
-    cytoscape_dagre_js = ""
-    
-    try:
-        with open(libs_dir / "cytoscape.min.js", "r", encoding="utf-8") as f:
-            cytoscape_js = f.read()
-        with open(libs_dir / "dagre.min.js", "r", encoding="utf-8") as f:
-            dagre_js = f.read()
-        with open(libs_dir / "cytoscape-dagre.min.js", "r", encoding="utf-8") as f:
-            cytoscape_dagre_js = f.read()
-    except Exception as e:
-        print(f"Warning: Could not read local libraries: {e}. Report may not work offline.")
+    libs_dir = find_libs_dir(output_path)
+    assets = publish_assets(libs_dir, assets_dir) if assets_dir else None
 
     # Prepare the HTML content
     html_template = """<!DOCTYPE html>
@@ -35,15 +305,9 @@ def generate_report(json_path: str, output_path: str):
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Canalysis Report</title>
-    <script>
-        /* CYTOSCAPE_LIB */
-    </script>
-    <script>
-        /* DAGRE_LIB */
-    </script>
-    <script>
-        /* CYTOSCAPE_DAGRE_LIB */
-    </script>
+    <!-- CYTOSCAPE_LIB -->
+    <!-- DAGRE_LIB -->
+    <!-- CYTOSCAPE_DAGRE_LIB -->
     <style>
         :root {
             --border-color: #e1e4e8;
@@ -277,8 +541,15 @@ def generate_report(json_path: str, output_path: str):
             padding-left: 25px;
         }
 
-        .folder-group {
-            margin-bottom: 2px;
+        .tree-spacer {
+            position: relative;
+        }
+
+        .tree-row {
+            position: absolute;
+            left: 0;
+            right: 0;
+            height: 28px;
         }
 
         .folder-header {
@@ -312,15 +583,6 @@ def generate_report(json_path: str, output_path: str):
             transform: rotate(-90deg);
         }
         
-        .folder-content {
-            display: block;
-            transition: all 0.2s;
-        }
-        
-        .folder-header.collapsed + .folder-content {
-            display: none;
-        }
-        
         /* Fix for File collapse */
         .file-header {
             padding: 6px 12px 6px 24px;
@@ -340,10 +602,6 @@ def generate_report(json_path: str, output_path: str):
             transform: rotate(-90deg);
         }
         
-        .file-header.collapsed + .folder-content {
-            display: none;
-        }
-        
         .file-icon {
             color: #6a737d;
         }
@@ -505,10 +763,11 @@ def generate_report(json_path: str, output_path: str):
     <div id="main-container">
         <div class="sidebar" id="left-sidebar">
             <div class="search-box">
-                <input type="text" id="search-input" placeholder="Filter functions..." onkeyup="filterFunctions()" data-i18n-placeholder="search_placeholder">
+                <input type="text" id="search-input" placeholder="Filter functions..." oninput="filterFunctions()" data-i18n-placeholder="search_placeholder">
             </div>
             <div class="file-tree" id="file-tree">
-                <!-- Tree content generated by JS -->
+                <!-- Only the visible rows are generated by JS -->
+                <div class="tree-spacer" id="tree-spacer"></div>
             </div>
         </div>
         <div class="resizer" id="resizer-left"></div>
@@ -533,8 +792,210 @@ def generate_report(json_path: str, output_path: str):
         </div>
     </div>
 
+    <script type="text/x-canalysis-worker" id="graph-worker-src">
+        // Graph worker: adjacency, search and neighbourhood queries over node
+        // indices, off the UI thread. Also evaluated on the page when Web
+        // Workers are unavailable, so it only defines handle().
+        let nodeCount = 0;
+        let lowerNames = [];
+        let outStart, outTarget, outCall, inStart, inSource, inCall;
+        let indexed = 0;
+        let trigrams = {};
+        const decoded = new Map(); // trigram -> absolute postings, filled on use
+
+        function init(msg) {
+            nodeCount = msg.ids.length;
+            lowerNames = msg.names.map(name => name.toLowerCase());
+            outStart = new Int32Array(nodeCount + 1);
+            inStart = new Int32Array(nodeCount + 1);
+            for (let i = 0; i < nodeCount; i++) {
+                outStart[i + 1] = outStart[i] + (msg.callees[i] ? msg.callees[i].length : 0);
+                inStart[i + 1] = inStart[i] + (msg.callers[i] ? msg.callers[i].length : 0);
+            }
+            outTarget = new Int32Array(outStart[nodeCount]);
+            outCall = new Int32Array(outStart[nodeCount]);
+            inSource = new Int32Array(inStart[nodeCount]);
+            inCall = new Int32Array(inStart[nodeCount]);
+            for (let i = 0; i < nodeCount; i++) {
+                (msg.callees[i] || []).forEach(([k, t], j) => {
+                    outTarget[outStart[i] + j] = t;
+                    outCall[outStart[i] + j] = k;
+                });
+                (msg.callers[i] || []).forEach(([src, k], j) => {
+                    inSource[inStart[i] + j] = src;
+                    inCall[inStart[i] + j] = k;
+                });
+            }
+            return outStart[nodeCount];
+        }
+
+        function neighbors(msg) {
+            const found = new Set();
+            msg.nodes.forEach(v => {
+                if (msg.direction !== 'children') {
+                    for (let p = inStart[v]; p < inStart[v + 1]; p++) found.add(inSource[p]);
+                }
+                if (msg.direction !== 'parents') {
+                    for (let p = outStart[v]; p < outStart[v + 1]; p++) found.add(outTarget[p]);
+                }
+            });
+            return Int32Array.from(found);
+        }
+
+        function subgraph(msg) {
+            // [source, target, callIndex] triples of the edges inside msg.nodes
+            // (every edge when msg.nodes is null)
+            if (!msg.nodes) {
+                const out = new Int32Array(outStart[nodeCount] * 3);
+                for (let v = 0, q = 0; v < nodeCount; v++) {
+                    for (let p = outStart[v]; p < outStart[v + 1]; p++, q += 3) {
+                        out[q] = v;
+                        out[q + 1] = outTarget[p];
+                        out[q + 2] = outCall[p];
+                    }
+                }
+                return out;
+            }
+            const inside = new Set(msg.nodes);
+            const out = [];
+            msg.nodes.forEach(v => {
+                for (let p = outStart[v]; p < outStart[v + 1]; p++) {
+                    if (inside.has(outTarget[p])) out.push(v, outTarget[p], outCall[p]);
+                }
+            });
+            return Int32Array.from(out);
+        }
+
+        function expand(msg) {
+            // Neighbours of msg.node not yet visible, their side (1 callee,
+            // -1 caller) and the edges joining them to the visible set, as
+            // [source, target, callIndex] triples
+            const visible = new Set(msg.visible);
+            const added = new Map();
+            const v = msg.node;
+            if (msg.direction !== 'parents') {
+                for (let p = outStart[v]; p < outStart[v + 1]; p++) {
+                    const t = outTarget[p];
+                    if (!visible.has(t) && !added.has(t)) added.set(t, 1);
+                }
+            }
+            if (msg.direction !== 'children') {
+                for (let p = inStart[v]; p < inStart[v + 1]; p++) {
+                    const u = inSource[p];
+                    if (!visible.has(u) && !added.has(u)) added.set(u, -1);
+                }
+            }
+            const edges = [];
+            added.forEach((side, u) => {
+                for (let p = outStart[u]; p < outStart[u + 1]; p++) {
+                    const t = outTarget[p];
+                    if (visible.has(t) || added.has(t)) edges.push(u, t, outCall[p]);
+                }
+                for (let p = inStart[u]; p < inStart[u + 1]; p++) {
+                    if (visible.has(inSource[p])) edges.push(inSource[p], u, inCall[p]);
+                }
+            });
+            return {
+                nodes: Int32Array.from(added.keys()),
+                sides: Int8Array.from(added.values()),
+                edges: Int32Array.from(edges)
+            };
+        }
+
+        function collapse(msg) {
+            // Visible neighbours of msg.node that are left with at most one
+            // visible edge; msg.keep (the focused node) always stays
+            const visible = new Set(msg.visible);
+            const removed = [];
+            neighbors({ nodes: [msg.node], direction: 'both' }).forEach(v => {
+                if (v === msg.keep || !visible.has(v)) return;
+                let degree = 0;
+                for (let p = outStart[v]; p < outStart[v + 1]; p++) if (visible.has(outTarget[p])) degree++;
+                for (let p = inStart[v]; p < inStart[v + 1]; p++) {
+                    if (inSource[p] !== v && visible.has(inSource[p])) degree++;
+                }
+                if (degree <= 1) removed.push(v);
+            });
+            return Int32Array.from(removed);
+        }
+
+        function loadIndex(msg) {
+            // Search index from build_search_index (parsed here, not on the page)
+            const index = JSON.parse(msg.text);
+            indexed = index.count;
+            trigrams = index.trigrams;
+            decoded.clear();
+            return indexed;
+        }
+
+        function postings(gram) {
+            let out = decoded.get(gram);
+            if (!out) {
+                const deltas = trigrams[gram] || [];
+                out = new Int32Array(deltas.length);
+                for (let j = 0, i = 0; j < deltas.length; j++) out[j] = i += deltas[j];
+                decoded.set(gram, out);
+            }
+            return out;
+        }
+
+        function intersect(a, b) {
+            const out = [];
+            for (let i = 0, j = 0; i < a.length && j < b.length;) {
+                if (a[i] < b[j]) i++;
+                else if (a[i] > b[j]) j++;
+                else { out.push(a[i]); i++; j++; }
+            }
+            return out;
+        }
+
+        function search(msg) {
+            const term = msg.term.toLowerCase();
+            if (term.length < 3) {
+                // Too short for trigrams: scan every name for the substring
+                const out = [];
+                for (let i = 0; i < indexed; i++) {
+                    if (lowerNames[i].includes(term)) out.push(i);
+                }
+                return Int32Array.from(out);
+            }
+            // Substring matches: intersect trigram postings, shortest first,
+            // then check the candidates
+            const grams = new Set();
+            for (let k = 0; k + 3 <= term.length; k++) grams.add(term.slice(k, k + 3));
+            const lists = Array.from(grams, postings).sort((a, b) => a.length - b.length);
+            let found = lists[0];
+            for (let k = 1; k < lists.length && found.length; k++) found = intersect(found, lists[k]);
+            return Int32Array.from(Array.from(found).filter(i => lowerNames[i].includes(term)));
+        }
+
+        function handle(msg) {
+            switch (msg.type) {
+                case 'init': return init(msg);
+                case 'index': return loadIndex(msg);
+                case 'neighbors': return neighbors(msg);
+                case 'subgraph': return subgraph(msg);
+                case 'expand': return expand(msg);
+                case 'collapse': return collapse(msg);
+                case 'search': return search(msg);
+            }
+            throw new Error('unknown request ' + msg.type);
+        }
+
+        if (typeof WorkerGlobalScope !== 'undefined' && self instanceof WorkerGlobalScope) {
+            self.onmessage = e => {
+                const result = handle(e.data);
+                const arrays = ArrayBuffer.isView(result) ? [result]
+                    : Object.values(result || {}).filter(value => ArrayBuffer.isView(value));
+                self.postMessage({ id: e.data.id, result }, arrays.map(a => a.buffer));
+            };
+        }
+    </script>
     <script>
         const rawData = DATA_PLACEHOLDER;
+        const graph = GRAPH_PLACEHOLDER;
+        // Directory of compressed body chunks (compact reports), else null
+        const bodyBase = BODIES_PLACEHOLDER;
         
         // I18N Configuration
         const i18n = {
@@ -618,18 +1079,33 @@ def generate_report(json_path: str, output_path: str):
         
         // Process data
         const nodesMap = {}; // id -> node data
-        const edges = [];
-        
-        // Helper to generate ID
-        function getId(item) {
-            return item.file_path + "::" + item.function_name;
-        }
+        const nodesList = []; // graph index -> node data
 
         // 1. Build Nodes Map and File Structure
-        rawData.forEach(item => {
-            const id = getId(item);
-            item.id = id;
-            nodesMap[id] = item;
+        // graph.ids[i] is the node id for rawData[i]; ids past rawData.length
+        // are external nodes named by graph.ghosts
+        rawData.forEach((item, i) => {
+            item.id = graph.ids[i];
+            item.idx = i;
+            nodesMap[item.id] = item;
+            nodesList.push(item);
+        });
+        graph.ghosts.forEach((name, k) => {
+            const idx = rawData.length + k;
+            const ghostNode = {
+                id: graph.ids[idx],
+                idx: idx,
+                function_name: name,
+                origin: "external",
+                file_path: "external",
+                line_number: 0,
+                summary: "External or unanalyzed function",
+                content: "",
+                calls: [],
+                notes: "Auto-generated external node"
+            };
+            nodesMap[ghostNode.id] = ghostNode;
+            nodesList.push(ghostNode);
         });
 
         // Re-building file structure
@@ -648,59 +1124,191 @@ def generate_report(json_path: str, output_path: str):
             currentDir[fileName]._funcs.push(item);
         });
 
-        // 2. Build Edges
-        rawData.forEach(item => {
-            const sourceId = item.id;
-            if (item.calls) {
-                item.calls.forEach(call => {
-                    // Find target in our data
-                    const candidates = rawData.filter(n => n.function_name === call.callee);
-                    if (candidates.length > 0) {
-                        candidates.forEach(target => {
-                            edges.push({
-                                data: {
-                                    source: sourceId,
-                                    target: target.id,
-                                    label: call.condition !== 'unconditional' ? call.condition : ''
-                                }
-                            });
-                        });
-                    } else {
-                        // External or missing node
-                        const ghostId = "external::" + call.callee;
-                        if (!nodesMap[ghostId]) {
-                            const ghostNode = {
-                                id: ghostId,
-                                function_name: call.callee,
-                                origin: "external",
-                                file_path: "external",
-                                line_number: 0,
-                                summary: "External or unanalyzed function",
-                                content: "",
-                                calls: [],
-                                notes: "Auto-generated external node"
-                            };
-                            nodesMap[ghostId] = ghostNode;
-                            edges.push({
-                                data: {
-                                    source: sourceId,
-                                    target: ghostId,
-                                    label: call.condition !== 'unconditional' ? call.condition : ''
-                                }
-                            });
-                        } else {
-                            edges.push({
-                                data: {
-                                    source: sourceId,
-                                    target: ghostId,
-                                    label: call.condition !== 'unconditional' ? call.condition : ''
-                                }
-                            });
-                        }
+        // 2. Graph worker. Adjacency, edge lists, neighbourhoods and search
+        // are computed off the UI thread; the tree paints before they finish.
+        const graphRequest = createGraphWorker();
+        const graphReady = graphRequest('init', {
+            ids: graph.ids,
+            names: nodesList.map(item => item.function_name),
+            callees: graph.callees,
+            callers: graph.callers
+        });
+
+        function createGraphWorker() {
+            const src = document.getElementById('graph-worker-src').textContent;
+            const pending = new Map();
+            let seq = 0;
+            let post = null;
+            const settle = (id, result) => {
+                pending.get(id)(result);
+                pending.delete(id);
+            };
+            try {
+                const worker = new Worker(URL.createObjectURL(new Blob([src], { type: 'text/javascript' })));
+                worker.onmessage = e => settle(e.data.id, e.data.result);
+                worker.onerror = e => console.error('Graph worker failed:', e.message);
+                post = msg => worker.postMessage(msg);
+            } catch (e) {
+                // No workers (e.g. blocked blob URLs): same handlers on this thread
+                const handle = new Function(src + '; return handle;')();
+                post = msg => Promise.resolve().then(() => settle(msg.id, handle(msg)));
+            }
+            return (type, payload) => new Promise(resolve => {
+                const id = ++seq;
+                pending.set(id, resolve);
+                post({ id, type, ...payload });
+            });
+        }
+
+        // The search index is parsed by the worker once its script element
+        // (after this one) exists, see window.onload
+        let resolveSearchIndex;
+        const searchReady = new Promise(resolve => { resolveSearchIndex = resolve; });
+
+        function edgeElements(triples) {
+            // Cytoscape edges for [source, target, callIndex] triples
+            const out = [];
+            for (let p = 0; p < triples.length; p += 3) {
+                const call = nodesList[triples[p]].calls[triples[p + 2]];
+                out.push({
+                    data: {
+                        source: graph.ids[triples[p]],
+                        target: graph.ids[triples[p + 1]],
+                        label: call.condition !== 'unconditional' ? call.condition : ''
                     }
                 });
             }
-        });
+            return out;
+        }
+
+        // 3. Directory -> file clusters (graph.hierarchy, optional). The global
+        // view then shows only the frontier: collapsed clusters plus the
+        // functions of expanded files, with call counts aggregated per edge.
+        const hierarchy = graph.hierarchy || null;
+        const CLUSTER_LIMIT = 1500; // most nodes the cluster view keeps live
+        const expandedClusters = new Set();
+        const clusterSize = [];
+        const clusterChildren = [];
+        const fileNodes = [];
+        if (hierarchy) {
+            hierarchy.clusters.forEach(() => { clusterSize.push(0); clusterChildren.push([]); fileNodes.push([]); });
+            hierarchy.clusters.forEach(([name, parent], c) => { if (parent >= 0) clusterChildren[parent].push(c); });
+            hierarchy.nodeCluster.forEach((c, i) => {
+                fileNodes[c].push(i);
+                for (let p = c; p >= 0; p = hierarchy.clusters[p][1]) clusterSize[p]++;
+            });
+        }
+
+        function clusterId(c) {
+            return 'cluster::' + c;
+        }
+
+        function clusterFrontier() {
+            // open[c]: c and all its ancestors are expanded; rep[c]: the
+            // visible cluster standing in for c (parents precede children)
+            const open = [];
+            const rep = [];
+            hierarchy.clusters.forEach(([name, parent], c) => {
+                const parentOpen = parent < 0 || open[parent];
+                open.push(parentOpen && expandedClusters.has(c));
+                rep.push(parentOpen ? c : rep[parent]);
+            });
+            return { open, rep };
+        }
+
+        function countVisible(open) {
+            let n = 0;
+            hierarchy.clusters.forEach(([name, parent], c) => {
+                if (parent >= 0 && !open[parent]) return;
+                n += open[c] ? (hierarchy.clusters[c][2] === 1 ? fileNodes[c].length : 0) : 1;
+            });
+            return n;
+        }
+
+        function renderClusters() {
+            cy.elements().remove();
+            const { open, rep } = clusterFrontier();
+            const nodeCluster = hierarchy.nodeCluster;
+            const repId = i => open[nodeCluster[i]] ? graph.ids[i] : clusterId(rep[nodeCluster[i]]);
+            const nodes = [];
+            hierarchy.clusters.forEach(([name, parent, kind], c) => {
+                if ((parent >= 0 && !open[parent]) || open[c]) return;
+                nodes.push({
+                    data: { id: clusterId(c), label: `${name} (${clusterSize[c]})`, weight: clusterSize[c] },
+                    classes: kind === 1 ? 'cluster cluster-file' : 'cluster cluster-dir'
+                });
+            });
+            const weights = new Map();
+            const addEdge = (source, target, w) => {
+                if (source === target) return;
+                if (!weights.has(source)) weights.set(source, new Map());
+                const out = weights.get(source);
+                out.set(target, (out.get(target) || 0) + w);
+            };
+            hierarchy.fileEdges.forEach(([a, b, w]) => {
+                if (open[a] || open[b]) return;
+                addEdge(clusterId(rep[a]), clusterId(rep[b]), w);
+            });
+            const shown = new Set();
+            hierarchy.clusters.forEach((cl, c) => {
+                if (!open[c] || cl[2] !== 1) return;
+                fileNodes[c].forEach(i => {
+                    const item = nodesList[i];
+                    if (shown.has(item.id)) return;
+                    shown.add(item.id);
+                    nodes.push({ data: { id: item.id, label: item.function_name, origin: item.origin }, classes: item.origin });
+                    (graph.callees[i] || []).forEach(([k, t]) => addEdge(item.id, repId(t), 1));
+                    (graph.callers[i] || []).forEach(([src]) => {
+                        if (!open[nodeCluster[src]]) addEdge(repId(src), item.id, 1);
+                    });
+                });
+            });
+            const clusterEdges = [];
+            weights.forEach((out, source) => out.forEach((w, target) => {
+                clusterEdges.push({
+                    data: { source, target, weight: w, label: w > 1 ? String(w) : '' },
+                    classes: 'cluster-edge'
+                });
+            }));
+            cy.add(nodes);
+            cy.add(clusterEdges);
+            runLayout();
+        }
+
+        function expandCluster(c) {
+            if (expandedClusters.has(c)) return;
+            expandedClusters.add(c);
+            if (countVisible(clusterFrontier().open) > CLUSTER_LIMIT) {
+                expandedClusters.delete(c);
+                console.warn(`Cluster view limited to ${CLUSTER_LIMIT} nodes; collapse other clusters first`);
+                return;
+            }
+            renderClusters();
+        }
+
+        function collapseCluster(c) {
+            if (c < 0) return;
+            expandedClusters.delete(c);
+            // Collapsing a cluster also collapses everything inside it
+            const stack = [...clusterChildren[c]];
+            while (stack.length) {
+                const k = stack.pop();
+                expandedClusters.delete(k);
+                stack.push(...clusterChildren[k]);
+            }
+            renderClusters();
+        }
+
+        function revealNode(id) {
+            // Expand the clusters on the path to a function node (an explicit
+            // jump, so CLUSTER_LIMIT is not enforced here)
+            const item = nodesMap[id];
+            if (!item) return;
+            for (let c = hierarchy.nodeCluster[item.idx]; c >= 0; c = hierarchy.clusters[c][1]) {
+                expandedClusters.add(c);
+            }
+            renderClusters();
+        }
 
         let cy = null;
         let currentView = 'global';
@@ -768,6 +1376,19 @@ def generate_report(json_path: str, output_path: str):
                                 'border-style': 'dashed'
                             }
                         },
+                        {
+                            selector: 'node.cluster',
+                            style: {
+                                'background-color': '#f6f8fa',
+                                'border-color': '#6f42c1',
+                                'color': '#24292e',
+                                'font-size': 'mapData(weight, 1, 500, 12, 24)'
+                            }
+                        },
+                        {
+                            selector: 'node.cluster-dir',
+                            style: { 'shape': 'barrel', 'border-style': 'double', 'border-width': 4 }
+                        },
                         {
                             selector: ':selected',
                             style: {
@@ -796,6 +1417,10 @@ def generate_report(json_path: str, output_path: str):
                                 'text-margin-y': -8
                             }
                         },
+                        {
+                            selector: 'edge.cluster-edge',
+                            style: { 'width': 'mapData(weight, 1, 100, 2, 10)', 'text-rotation': 'none' }
+                        },
                         {
                             selector: 'edge.highlighted',
                             style: {
@@ -810,8 +1435,12 @@ def generate_report(json_path: str, output_path: str):
 
                 cy.on('tap', 'node', function(evt){
                     const node = evt.target;
-                    selectNode(node.id());
                     hideContextMenu();
+                    if (node.hasClass('cluster')) {
+                        expandCluster(Number(node.id().slice(9)));
+                        return;
+                    }
+                    selectNode(node.id());
                 });
                 
                 cy.on('tap', function(evt){
@@ -820,12 +1449,21 @@ def generate_report(json_path: str, output_path: str):
 
                 cy.on('dbltap', 'node', function(evt){
                     const node = evt.target;
+                    if (node.hasClass('cluster')) return;
                     selectNode(node.id());
                     switchView('local');
                 });
                 
                 cy.on('cxttap', 'node', function(evt){
                     const node = evt.target;
+                    if (hierarchy && currentView === 'global') {
+                        // Right click in the cluster view collapses the enclosing cluster
+                        const id = node.id();
+                        collapseCluster(node.hasClass('cluster')
+                            ? hierarchy.clusters[Number(id.slice(9))][1]
+                            : hierarchy.nodeCluster[nodesMap[id].idx]);
+                        return;
+                    }
                     contextNodeId = node.id();
                     showContextMenu(evt.originalEvent.clientX, evt.originalEvent.clientY);
                 });
@@ -866,122 +1504,207 @@ def generate_report(json_path: str, output_path: str):
             }
         }
 
+        // Bumped whenever the graph view changes so late worker replies for
+        // a previous view are dropped
+        let viewSeq = 0;
+
+        function whenCurrent(promise, then) {
+            const seq = ++viewSeq;
+            return promise.then(result => {
+                if (seq === viewSeq) then(result);
+            });
+        }
+
         function renderGlobal() {
-            cy.elements().remove();
-            const nodes = Object.values(nodesMap).map(item => ({
-                data: { id: item.id, label: item.function_name, origin: item.origin },
-                classes: item.origin
-            }));
-            cy.add(nodes);
-            cy.add(edges);
-            runLayout();
+            if (hierarchy) {
+                viewSeq++;
+                renderClusters();
+                return Promise.resolve();
+            }
+            // Edges come from the worker; graph.positions (precomputed by
+            // generate_report) skips Dagre
+            return whenCurrent(graphReady.then(() => graphRequest('subgraph', { nodes: null })), triples => {
+                cy.elements().remove();
+                const positions = graph.positions;
+                const nodes = Object.values(nodesMap).map(item => ({
+                    data: { id: item.id, label: item.function_name, origin: item.origin },
+                    classes: item.origin,
+                    position: positions ? { x: positions[item.idx][0], y: positions[item.idx][1] } : undefined
+                }));
+                cy.add(nodes);
+                cy.add(edgeElements(triples));
+                if (positions) runLayout({ name: 'preset', animate: false });
+                else runLayout();
+            });
+        }
+
+        function visibleIndices() {
+            return Array.from(visibleNodeIds, id => nodesMap[id].idx);
         }
 
         function renderLocal(centerId) {
             if (!centerId) return;
-            visibleNodeIds.clear();
-            visibleNodeIds.add(centerId);
-            edges.forEach(e => {
-                if (e.data.source === centerId) visibleNodeIds.add(e.data.target);
-                if (e.data.target === centerId) visibleNodeIds.add(e.data.source);
+            const request = graphReady.then(() =>
+                graphRequest('neighbors', { nodes: [nodesMap[centerId].idx], direction: 'both' }));
+            whenCurrent(request, found => {
+                visibleNodeIds = new Set([centerId]);
+                found.forEach(i => visibleNodeIds.add(graph.ids[i]));
+                refreshLocalGraph(centerId);
             });
-            refreshLocalGraph(centerId);
         }
         
         function refreshLocalGraph(centerId) {
-            cy.elements().remove();
-            const nodesToAdd = [];
-            visibleNodeIds.forEach(id => {
-                const item = nodesMap[id];
-                if (item) {
-                    nodesToAdd.push({
-                        data: { id: id, label: item.function_name, origin: item.origin },
-                        classes: item.origin
-                    });
-                }
-            });
-            cy.add(nodesToAdd);
-            const edgesToAdd = [];
-            edges.forEach(e => {
-                if (visibleNodeIds.has(e.data.source) && visibleNodeIds.has(e.data.target)) {
-                    edgesToAdd.push(e);
-                }
+            whenCurrent(graphRequest('subgraph', { nodes: visibleIndices() }), triples => {
+                cy.elements().remove();
+                const nodesToAdd = [];
+                visibleNodeIds.forEach(id => {
+                    const item = nodesMap[id];
+                    if (item) {
+                        nodesToAdd.push({
+                            data: { id: id, label: item.function_name, origin: item.origin },
+                            classes: item.origin
+                        });
+                    }
+                });
+                cy.add(nodesToAdd);
+                cy.add(edgeElements(triples));
+                
+                // Run layout with a callback to adjust zoom cleanly
+                const layout = cy.layout({
+                    name: 'dagre',
+                    rankDir: 'LR',
+                    nodeSep: 60,
+                    rankSep: 120,
+                    padding: 50,
+                    animate: true,
+                    animationDuration: 500,
+                    fit: true,
+                    stop: function() {
+                        // Post-layout adjustment
+                        if (centerId) {
+                            cy.getElementById(centerId).select();
+                            // Smoothly zoom out a bit if it's too tight
+                            // Note: dagre 'fit' puts it in view. We want to shrink 20%.
+                            const currentZoom = cy.zoom();
+                            cy.animate({
+                                zoom: currentZoom * 0.8,
+                                center: { eles: cy.getElementById(centerId) }
+                            }, { duration: 300 });
+                        }
+                    }
+                });
+                layout.run();
             });
-            cy.add(edgesToAdd);
-            
-            // Run layout with a callback to adjust zoom cleanly
-            const layout = cy.layout({
-                name: 'dagre',
-                rankDir: 'LR',
-                nodeSep: 60,
-                rankSep: 120,
-                padding: 50,
-                animate: true,
-                animationDuration: 500,
-                fit: true,
-                stop: function() {
-                    // Post-layout adjustment
-                    if (centerId) {
-                        cy.getElementById(centerId).select();
-                        // Smoothly zoom out a bit if it's too tight
-                        // Note: dagre 'fit' puts it in view. We want to shrink 20%.
-                        const currentZoom = cy.zoom();
-                        cy.animate({
-                            zoom: currentZoom * 0.8,
-                            center: { eles: cy.getElementById(centerId) }
-                        }, { duration: 300 });
+        }
+        
+        // Expanding or collapsing in the focus view edits the graph in place:
+        // only the affected nodes and edges are added or removed, and new
+        // nodes are placed next to their anchor instead of re-running Dagre.
+        // Operations run one at a time so each sees the previous one's nodes.
+        const LOCAL_RANK_SEP = 120;
+        const LOCAL_ROW_STEP = 100; // node height + node separation
+        const LOCAL_COLUMN_ROWS = 20;
+        let localOps = Promise.resolve();
+
+        function localOp(run) {
+            const seq = viewSeq;
+            localOps = localOps.then(() => seq === viewSeq && currentView === 'local' ? run(seq) : null)
+                .catch(e => console.error('Graph update failed:', e));
+        }
+
+        function labelWidth(item) {
+            // Same estimate as visualization/layout.py (12px bold label + padding)
+            return 24 + 7.5 * item.function_name.length;
+        }
+
+        function placeNeighbors(anchor, items, side) {
+            // Columns of up to LOCAL_COLUMN_ROWS nodes left (callers) or right
+            // (callees) of the anchor, centred on it; nodes that would overlap
+            // one already on screen move to the nearest free row
+            const rows = new Map(); // row bucket -> [x, y, half width] of occupied boxes
+            const occupy = (x, y, w) => {
+                const b = Math.floor(y / LOCAL_ROW_STEP);
+                if (!rows.has(b)) rows.set(b, []);
+                rows.get(b).push([x, y, w / 2]);
+            };
+            const free = (x, y, w) => {
+                const b = Math.floor(y / LOCAL_ROW_STEP);
+                for (let r = b - 1; r <= b + 1; r++) {
+                    for (const [ox, oy, ow] of rows.get(r) || []) {
+                        if (Math.abs(ox - x) < ow + w / 2 + 20 && Math.abs(oy - y) < LOCAL_ROW_STEP - 20) return false;
                     }
                 }
+                return true;
+            };
+            cy.nodes().forEach(n => {
+                const pos = n.position();
+                occupy(pos.x, pos.y, n.outerWidth());
             });
-            layout.run();
+            const a = anchor.position();
+            let x = a.x + side * (anchor.outerWidth() / 2 + LOCAL_RANK_SEP);
+            const out = [];
+            for (let c = 0; c < items.length; c += LOCAL_COLUMN_ROWS) {
+                const column = items.slice(c, c + LOCAL_COLUMN_ROWS);
+                const w = Math.max(...column.map(labelWidth));
+                const cx = x + side * w / 2;
+                const top = a.y - (column.length - 1) * LOCAL_ROW_STEP / 2;
+                column.forEach((item, r) => {
+                    let y = top + r * LOCAL_ROW_STEP;
+                    for (let k = 1; !free(cx, y, labelWidth(item)); k++) {
+                        y = top + r * LOCAL_ROW_STEP + (k % 2 ? 1 : -1) * Math.ceil(k / 2) * LOCAL_ROW_STEP / 2;
+                    }
+                    occupy(cx, y, labelWidth(item));
+                    out.push({
+                        data: { id: item.id, label: item.function_name, origin: item.origin },
+                        classes: item.origin,
+                        position: { x: cx, y }
+                    });
+                });
+                x += side * (w + LOCAL_RANK_SEP);
+            }
+            return out;
         }
-        
+
         function expandNode(nodeId, direction) {
             hideContextMenu();
             if (!nodeId) return;
-            let added = false;
-            if (direction === 'parents' || !direction) {
-                edges.forEach(e => {
-                    if (e.data.target === nodeId && !visibleNodeIds.has(e.data.source)) {
-                        visibleNodeIds.add(e.data.source);
-                        added = true;
-                    }
+            localOp(seq => graphReady.then(() => graphRequest('expand', {
+                node: nodesMap[nodeId].idx,
+                direction: direction || 'both',
+                visible: visibleIndices()
+            })).then(({ nodes, sides, edges }) => {
+                const anchor = cy.getElementById(nodeId);
+                if (seq !== viewSeq || !nodes.length || !anchor.length) return;
+                const callers = [], callees = [];
+                nodes.forEach((i, j) => {
+                    visibleNodeIds.add(graph.ids[i]);
+                    (sides[j] < 0 ? callers : callees).push(nodesList[i]);
                 });
-            }
-            if (direction === 'children' || !direction) {
-                edges.forEach(e => {
-                    if (e.data.source === nodeId && !visibleNodeIds.has(e.data.target)) {
-                        visibleNodeIds.add(e.data.target);
-                        added = true;
-                    }
+                let added;
+                cy.batch(() => {
+                    added = cy.add(placeNeighbors(anchor, callers, -1)
+                        .concat(placeNeighbors(anchor, callees, 1), edgeElements(edges)));
                 });
-            }
-            if (added) refreshLocalGraph(selectedNodeId);
+                cy.animate({ fit: { eles: added.union(anchor), padding: 50 } }, { duration: 300 });
+            }));
         }
         
         function collapseNode(nodeId) {
             hideContextMenu();
             if (!nodeId) return;
-            const neighbors = new Set();
-            edges.forEach(e => {
-                if (e.data.source === nodeId && visibleNodeIds.has(e.data.target)) neighbors.add(e.data.target);
-                if (e.data.target === nodeId && visibleNodeIds.has(e.data.source)) neighbors.add(e.data.source);
-            });
-            let removed = false;
-            neighbors.forEach(nId => {
-                if (nId === selectedNodeId) return; 
-                let degree = 0;
-                edges.forEach(e => {
-                    if (visibleNodeIds.has(e.data.source) && visibleNodeIds.has(e.data.target)) {
-                        if (e.data.source === nId || e.data.target === nId) degree++;
-                    }
+            localOp(seq => graphReady.then(() => graphRequest('collapse', {
+                node: nodesMap[nodeId].idx,
+                visible: visibleIndices(),
+                keep: selectedNodeId ? nodesMap[selectedNodeId].idx : -1
+            })).then(removed => {
+                if (seq !== viewSeq) return;
+                cy.batch(() => {
+                    removed.forEach(i => {
+                        visibleNodeIds.delete(graph.ids[i]);
+                        cy.getElementById(graph.ids[i]).remove();
+                    });
                 });
-                if (degree <= 1) {
-                    visibleNodeIds.delete(nId);
-                    removed = true;
-                }
-            });
-            if (removed) refreshLocalGraph(selectedNodeId);
+            }));
         }
 
         function switchView(mode) {
@@ -994,15 +1717,17 @@ def generate_report(json_path: str, output_path: str):
             document.getElementById('btn-' + mode).classList.add('active');
             
             if (mode === 'global') {
-                renderGlobal();
-                if (selectedNodeId && cy.getElementById(selectedNodeId).length > 0) {
-                    cy.getElementById(selectedNodeId).select();
-                    // Just center, don't force zoom unless needed
-                    cy.animate({
-                        center: { eles: cy.getElementById(selectedNodeId) },
-                        zoom: 1
-                    }, { duration: 500 });
-                }
+                renderGlobal().then(() => {
+                    if (currentView !== 'global') return;
+                    if (selectedNodeId && cy.getElementById(selectedNodeId).length > 0) {
+                        cy.getElementById(selectedNodeId).select();
+                        // Just center, don't force zoom unless needed
+                        cy.animate({
+                            center: { eles: cy.getElementById(selectedNodeId) },
+                            zoom: 1
+                        }, { duration: 500 });
+                    }
+                });
             } else {
                 if (selectedNodeId) renderLocal(selectedNodeId);
                 else cy.elements().remove();
@@ -1014,29 +1739,13 @@ def generate_report(json_path: str, output_path: str):
             selectedNodeId = id;
             
             // Update tree selection
-            document.querySelectorAll('.tree-item').forEach(el => el.classList.remove('selected'));
-            if (!id.startsWith("external::")) {
-                const treeEl = document.getElementById('tree-' + id.replace(/[^a-zA-Z0-9]/g, '_'));
-                if (treeEl) {
-                    treeEl.classList.add('selected');
-                    let parent = treeEl.parentElement;
-                    while (parent && !parent.classList.contains('file-tree')) {
-                        if (parent.classList.contains('folder-content')) {
-                            const header = parent.previousElementSibling;
-                            if (header && header.classList.contains('collapsed')) {
-                                toggleFolder(header);
-                            }
-                        }
-                        parent = parent.parentElement;
-                    }
-                    treeEl.scrollIntoView({ block: 'center', behavior: 'smooth' });
-                }
-            }
+            revealInTree(id);
             
             renderDetails(id);
             
             if (currentView === 'global') {
                 cy.$(':selected').unselect();
+                if (hierarchy && cy.getElementById(id).length === 0) revealNode(id);
                 const el = cy.getElementById(id);
                 if (el.length > 0) el.select();
             } else {
@@ -1056,8 +1765,14 @@ def generate_report(json_path: str, output_path: str):
             
             let callsHtml = '';
             if (item.calls && item.calls.length > 0) {
-                callsHtml = item.calls.map(c => {
-                    const target = rawData.find(n => n.function_name === c.callee);
+                // First resolved definition per call; external nodes are not links
+                const firstTarget = {};
+                (graph.callees[item.idx] || []).forEach(([k, t]) => {
+                    if (!(k in firstTarget)) firstTarget[k] = t;
+                });
+                callsHtml = item.calls.map((c, k) => {
+                    const t = firstTarget[k];
+                    const target = t !== undefined && t < rawData.length ? nodesList[t] : null;
                     const clickAction = target ? `onclick="jumpTo('${target.id}')"` : '';
                     const style = target ? '' : 'style="color:#666; cursor:default; text-decoration:none;"';
                     return `<a class="call-link" ${style} ${clickAction}>
@@ -1071,20 +1786,11 @@ def generate_report(json_path: str, output_path: str):
 
             // Calculate callers
             let callersHtml = '';
-            const callerList = [];
-            rawData.forEach(other => {
-                if (other.calls) {
-                    other.calls.forEach(c => {
-                        if (c.callee === item.function_name) {
-                            callerList.push({
-                                id: other.id,
-                                name: other.function_name,
-                                condition: c.condition
-                            });
-                        }
-                    });
-                }
-            });
+            const callerList = (graph.callers[item.idx] || []).map(([s, k]) => ({
+                id: rawData[s].id,
+                name: rawData[s].function_name,
+                condition: rawData[s].calls[k].condition
+            }));
             
             if (callerList.length > 0) {
                 callersHtml = callerList.map(c => {
@@ -1136,7 +1842,7 @@ def generate_report(json_path: str, output_path: str):
                 
                 <div class="detail-section">
                     <div class="detail-title">${i18n[currentLang].code}</div>
-                    <div class="code-block">${item.content.replace(/</g, '&lt;').replace(/>/g, '&gt;')}</div>
+                    <div class="code-block" id="code-block"></div>
                 </div>
                 
                 <div class="detail-section">
@@ -1146,6 +1852,52 @@ def generate_report(json_path: str, output_path: str):
                     </div>
                 </div>
             `;
+            renderCode(item);
+        }
+
+        // Bodies of compact reports live in chunk scripts next to the report;
+        // each chunk is loaded once and decoded (base64 + gzip) on first use
+        const bodyChunks = {};
+        const bodyChunkLoaded = {};
+
+        function canalysisBodyChunk(n, blob) {
+            if (bodyChunkLoaded[n]) bodyChunkLoaded[n](blob);
+        }
+
+        function loadBodyChunk(n) {
+            if (!bodyChunks[n]) {
+                bodyChunks[n] = new Promise((resolve, reject) => {
+                    bodyChunkLoaded[n] = resolve;
+                    const script = document.createElement('script');
+                    script.src = `${bodyBase}/${String(n).padStart(5, '0')}.js`;
+                    script.onerror = () => reject(new Error('missing body chunk ' + n));
+                    document.head.appendChild(script);
+                }).then(blob => {
+                    const bytes = Uint8Array.from(atob(blob), c => c.charCodeAt(0));
+                    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+                    return new Response(stream).text();
+                }).then(JSON.parse);
+                bodyChunks[n].catch(() => { delete bodyChunks[n]; });
+            }
+            return bodyChunks[n];
+        }
+
+        function getBody(item) {
+            if (typeof item.content === 'string') return Promise.resolve(item.content);
+            if (!item.body || !bodyBase) return Promise.resolve('');
+            return loadBodyChunk(item.body[0]).then(chunk => chunk[item.body[1]]);
+        }
+
+        function renderCode(item) {
+            const block = document.getElementById('code-block');
+            if (typeof item.content !== 'string') block.textContent = '...';
+            getBody(item).then(text => {
+                const current = document.getElementById('code-block');
+                if (current && selectedNodeId === item.id) current.textContent = text;
+            }).catch(err => {
+                const current = document.getElementById('code-block');
+                if (current && selectedNodeId === item.id) current.textContent = String(err);
+            });
         }
 
         function jumpTo(id) {
@@ -1153,11 +1905,18 @@ def generate_report(json_path: str, output_path: str):
             switchView('local');
         }
 
-        function toggleFolder(element) {
-            element.classList.toggle('collapsed');
-        }
+        // Sidebar tree. Directories and files become tree nodes once; only
+        // the rows inside the scrolled window exist in the DOM, each
+        // TREE_ROW_HEIGHT pixels tall.
+        const TREE_ROW_HEIGHT = 28;
+        const TREE_OVERSCAN = 10;
+        const treeParent = []; // function index -> file tree node
+        const treeRoots = buildTreeNodes(treeData, null, 0);
+        let treeRows = [];
+        let treeFilter = null; // Set of matching function indices while searching
+        let treeFrame = 0;
 
-        function renderTree(data, container) {
+        function buildTreeNodes(data, parent, depth) {
             const keys = Object.keys(data).sort((a, b) => {
                 const aIsDir = data[a]._type === 'dir';
                 const bIsDir = data[b]._type === 'dir';
@@ -1165,82 +1924,146 @@ def generate_report(json_path: str, output_path: str):
                 if (!aIsDir && bIsDir) return 1;
                 return a.localeCompare(b);
             });
-            
-            keys.forEach(key => {
+            return keys.map(key => {
                 const item = data[key];
-                
-                if (item._type === 'dir') {
-                    const group = document.createElement('div');
-                    group.className = 'folder-group';
-                    
-                    const header = document.createElement('div');
-                    header.className = 'folder-header'; 
-                    header.innerHTML = '<span class="folder-icon">▼</span> ' + key;
-                    header.onclick = () => toggleFolder(header);
-                    
-                    const content = document.createElement('div');
-                    content.className = 'folder-content';
-                    content.style.paddingLeft = '12px';
-                    
-                    group.appendChild(header);
-                    group.appendChild(content);
-                    container.appendChild(group);
-                    
-                    renderTree(item._children, content);
-                } else if (item._type === 'file') {
-                    const group = document.createElement('div');
-                    group.className = 'folder-group';
-                    
-                    const header = document.createElement('div');
-                    header.className = 'file-header collapsed'; 
-                    header.innerHTML = '<span class="folder-icon">▼</span> <span style="color:#24292e">' + key + '</span>';
-                    header.onclick = () => toggleFolder(header);
-
-                    const content = document.createElement('div');
-                    content.className = 'folder-content'; 
-                    
-                    group.appendChild(header);
-                    group.appendChild(content);
-                    
-                    item._funcs.forEach(func => {
-                        const funcDiv = document.createElement('div');
-                        funcDiv.className = 'tree-item function-node';
-                        funcDiv.textContent = func.function_name;
-                        funcDiv.id = 'tree-' + func.id.replace(/[^a-zA-Z0-9]/g, '_');
-                        funcDiv.onclick = (e) => {
-                            e.stopPropagation();
-                            selectNode(func.id);
-                            switchView('local');
-                        };
-                        content.appendChild(funcDiv);
-                    });
-                    
-                    container.appendChild(group);
+                const node = { key, parent, depth, dir: item._type === 'dir', collapsed: item._type !== 'dir' };
+                if (node.dir) {
+                    node.children = buildTreeNodes(item._children, node, depth + 1);
+                } else {
+                    node.funcs = item._funcs;
+                    node.funcs.forEach(func => { treeParent[func.idx] = node; });
                 }
+                return node;
             });
         }
 
-        function filterFunctions() {
-            const term = document.getElementById('search-input').value.toLowerCase();
-            const items = document.querySelectorAll('.function-node');
-            const isFiltering = term.length > 0;
-            
-            items.forEach(item => {
-                if (item.textContent.toLowerCase().includes(term)) {
-                    item.style.display = 'flex';
-                    if (isFiltering) {
-                        let parent = item.parentElement;
-                        while(parent && !parent.classList.contains('file-tree')) {
-                            if (parent.classList.contains('folder-content')) {
-                                parent.previousElementSibling.classList.remove('collapsed');
-                            }
-                            parent = parent.parentElement;
-                        }
-                    }
+        function countMatches(nodes) {
+            // node.matches: matching functions below each node (all when not filtering)
+            let total = 0;
+            nodes.forEach(node => {
+                if (node.dir) node.matches = countMatches(node.children);
+                else node.matches = treeFilter ? node.funcs.filter(f => treeFilter.has(f.idx)).length : node.funcs.length;
+                total += node.matches;
+            });
+            return total;
+        }
+
+        function flattenTree(nodes, out) {
+            nodes.forEach(node => {
+                if (treeFilter && !node.matches) return;
+                out.push({ node });
+                if (node.collapsed) return;
+                if (node.dir) {
+                    flattenTree(node.children, out);
                 } else {
-                    item.style.display = 'none';
+                    node.funcs.forEach(func => {
+                        if (!treeFilter || treeFilter.has(func.idx)) out.push({ func, depth: node.depth });
+                    });
                 }
             });
+            return out;
+        }
+
+        function refreshTree() {
+            treeRows = flattenTree(treeRoots, []);
+            document.getElementById('tree-spacer').style.height = (treeRows.length * TREE_ROW_HEIGHT) + 'px';
+            drawTreeRows();
+        }
+
+        function scheduleTreeDraw() {
+            if (!treeFrame) treeFrame = requestAnimationFrame(() => { treeFrame = 0; drawTreeRows(); });
+        }
+
+        function drawTreeRows() {
+            const container = document.getElementById('file-tree');
+            const spacer = document.getElementById('tree-spacer');
+            const first = Math.max(0, Math.floor(container.scrollTop / TREE_ROW_HEIGHT) - TREE_OVERSCAN);
+            const last = Math.min(treeRows.length, Math.ceil((container.scrollTop + container.clientHeight) / TREE_ROW_HEIGHT) + TREE_OVERSCAN);
+            const fragment = document.createDocumentFragment();
+            for (let i = first; i < last; i++) fragment.appendChild(treeRowElement(treeRows[i], i));
+            spacer.replaceChildren(fragment);
+        }
+
+        function treeRowElement(row, i) {
+            const div = document.createElement('div');
+            div.style.top = (i * TREE_ROW_HEIGHT) + 'px';
+            if (row.func) {
+                const func = row.func;
+                const selected = func.id === selectedNodeId;
+                div.className = 'tree-row tree-item function-node' + (selected ? ' selected' : '');
+                div.style.paddingLeft = ((selected ? 25 : 28) + 12 * row.depth) + 'px';
+                div.textContent = func.function_name;
+                div.id = 'tree-' + func.id.replace(/[^a-zA-Z0-9]/g, '_');
+                div.onclick = (e) => {
+                    e.stopPropagation();
+                    selectNode(func.id);
+                    switchView('local');
+                };
+                return div;
+            }
+            const node = row.node;
+            const collapsed = node.collapsed;
+            div.className = 'tree-row ' + (node.dir ? 'folder-header' : 'file-header') + (collapsed ? ' collapsed' : '');
+            div.style.paddingLeft = ((node.dir ? 12 : 24) + 12 * node.depth) + 'px';
+            const icon = document.createElement('span');
+            icon.className = 'folder-icon';
+            icon.textContent = '▼';
+            const label = document.createElement('span');
+            label.textContent = node.key;
+            if (!node.dir) label.style.color = '#24292e';
+            div.append(icon, ' ', label);
+            div.onclick = () => {
+                node.collapsed = !node.collapsed;
+                refreshTree();
+            };
+            return div;
+        }
+
+        function revealInTree(id) {
+            // Open the path to a function's row and scroll it to the middle
+            const item = nodesMap[id];
+            if (!item || id.startsWith("external::")) {
+                drawTreeRows();
+                return;
+            }
+            for (let node = treeParent[item.idx]; node; node = node.parent) node.collapsed = false;
+            refreshTree();
+            const row = treeRows.findIndex(r => r.func === item);
+            if (row >= 0) {
+                const container = document.getElementById('file-tree');
+                container.scrollTop = Math.max(0, (row + 0.5) * TREE_ROW_HEIGHT - container.clientHeight / 2);
+                drawTreeRows();
+            }
+        }
+
+        let searchTimer = 0;
+        let searchSeq = 0;
+
+        function filterFunctions() {
+            // Debounced; matching runs in the graph worker against the index
+            // from build_search_index, and only the latest reply is applied
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(runSearch, 150);
+        }
+
+        function runSearch() {
+            const term = document.getElementById('search-input').value;
+            const seq = ++searchSeq;
+            const apply = found => {
+                if (seq !== searchSeq) return;
+                treeFilter = found && new Set(found);
+                if (found) {
+                    // Open every directory and file holding a match
+                    found.forEach(i => {
+                        for (let node = treeParent[i]; node; node = node.parent) node.collapsed = false;
+                    });
+                }
+                countMatches(treeRoots);
+                document.getElementById('file-tree').scrollTop = 0;
+                refreshTree();
+            };
+            if (!term) apply(null);
+            else searchReady.then(() => graphRequest('search', { term })).then(apply);
         }
 
         function initResizers() {
@@ -1274,28 +2097,29 @@ def generate_report(json_path: str, output_path: str):
         }
 
         window.onload = function() {
-            renderTree(treeData, document.getElementById('file-tree'));
+            resolveSearchIndex(graphRequest('index', { text: document.getElementById('search-index').textContent }));
+            const tree = document.getElementById('file-tree');
+            tree.addEventListener('scroll', scheduleTreeDraw);
+            window.addEventListener('resize', scheduleTreeDraw);
+            refreshTree();
             initResizers();
-            setTimeout(initCy, 100); 
-            setTimeout(renderGlobal, 200);
+            // The tree is already painted; the graph fills in once the
+            // worker has built the adjacency
+            initCy();
+            renderGlobal();
         };
 
     </script>
+    <script type="application/json" id="search-index">SEARCH_INDEX_PLACEHOLDER</script>
 </body>
 </html>"""
 
-    # Inject libraries and data
-    html_content = html_template.replace("/* CYTOSCAPE_LIB */", cytoscape_js)
-    html_content = html_content.replace("/* DAGRE_LIB */", dagre_js)
-    html_content = html_content.replace("/* CYTOSCAPE_DAGRE_LIB */", cytoscape_dagre_js)
-    
-    # Inject JSON data using proper escaping
-    json_str = json.dumps(data, ensure_ascii=False)
-    html_content = html_content.replace("DATA_PLACEHOLDER", json_str)
-
-    # Write HTML
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    records = iter_ndjson(json_path) if stream else data
+    bodies = None
+    if compact:
+        out = Path(output_path)
+        bodies = BodyChunks(out.parent / f"{out.stem}_bodies")
+    write_report_stream(html_template, records, output_path, bodies, libs_dir, assets, layout, hierarchy, symbols)
     print(f"Successfully generated report at {output_path}")
 
 if __name__ == "__main__":
@@ -1308,10 +2132,13 @@ if __name__ == "__main__":
         print(f"Warning: {json_file} not found. Checking alternatives...")
         alt1 = root / "llm" / "function_analysis_serial.json"
         alt2 = root / "llm" / "function_analysis_async.json"
+        alt3 = root / "llm" / "function_analysis.ndjson"
         if alt1.exists():
             json_file = alt1
         elif alt2.exists():
             json_file = alt2
+        elif alt3.exists():
+            json_file = alt3
     
     output_file = root / "visualization" / "report.html"
     generate_report(str(json_file), str(output_file))
@@ -0,0 +1,119 @@
+from collections import defaultdict
+
+# Geometry of the report's node style (12px bold label, 12px padding) and
+# the spacing runLayout uses for Dagre, so precomputed and browser layouts
+# look alike.
+CHAR_WIDTH = 7.5
+NODE_PADDING = 24
+NODE_HEIGHT = 40
+NODE_SEP = 60
+RANK_SEP = 120
+
+
+def _acyclic(n, edges):
+    # Iterative DFS; edges closing a cycle (to a node on the stack) are
+    # reversed so every remaining edge points to a later rank
+    out = defaultdict(list)
+    for s, t in edges:
+        out[s].append(t)
+    state = [0] * n  # 0 new, 1 on stack, 2 done
+    back = set()
+    for root in range(n):
+        if state[root]:
+            continue
+        state[root] = 1
+        stack = [(root, iter(out[root]))]
+        while stack:
+            v, it = stack[-1]
+            for t in it:
+                if state[t] == 1:
+                    back.add((v, t))
+                elif state[t] == 0:
+                    state[t] = 1
+                    stack.append((t, iter(out[t])))
+                    break
+            else:
+                state[v] = 2
+                stack.pop()
+    return [(t, s) if (s, t) in back else (s, t) for s, t in edges]
+
+
+def _ranks(n, edges):
+    # Longest path from the sources, in topological order
+    out = defaultdict(list)
+    indeg = [0] * n
+    for s, t in edges:
+        out[s].append(t)
+        indeg[t] += 1
+    rank = [0] * n
+    queue = [v for v in range(n) if indeg[v] == 0]
+    for v in queue:
+        for t in out[v]:
+            rank[t] = max(rank[t], rank[v] + 1)
+            indeg[t] -= 1
+            if indeg[t] == 0:
+                queue.append(t)
+    return rank
+
+
+def _order(layers, up, down, sweeps):
+    # Barycenter heuristic: alternately sort each layer by the mean position
+    # of its neighbours in the layers before (down sweep) or after (up sweep)
+    pos = [0.0] * sum(len(layer) for layer in layers)
+    for layer in layers:
+        for i, v in enumerate(layer):
+            pos[v] = i / max(1, len(layer) - 1)
+    for sweep in range(sweeps):
+        downward = sweep % 2 == 0
+        seq = layers if downward else layers[::-1]
+        for layer in seq:
+            nbrs = up if downward else down
+
+            def key(v):
+                ps = [pos[u] for u in nbrs[v]]
+                return sum(ps) / len(ps) if ps else pos[v]
+
+            layer.sort(key=key)
+            for i, v in enumerate(layer):
+                pos[v] = i / max(1, len(layer) - 1)
+    return layers
+
+
+def layered_layout(labels, edges, sweeps: int = 4):
+    """Left-to-right layered (Sugiyama-style) layout.
+
+    ``labels`` gives one label per node, ``edges`` are ``(source, target)``
+    index pairs. Returns ``[x, y]`` node centres in pixels. Cycles are broken
+    by reversing DFS back edges, ranks are longest paths from the sources
+    and each rank is ordered by barycenter sweeps; all steps are linear in
+    nodes + edges per sweep (plus sorting within ranks).
+    """
+    n = len(labels)
+    if not n:
+        return []
+    edges = sorted({(s, t) for s, t in edges if s != t})
+    edges = _acyclic(n, edges)
+    rank = _ranks(n, edges)
+    up = defaultdict(list)
+    down = defaultdict(list)
+    for s, t in edges:
+        down[s].append(t)
+        up[t].append(s)
+    layers = [[] for _ in range(max(rank) + 1)]
+    for v in range(n):
+        layers[rank[v]].append(v)
+    layers = _order(layers, up, down, sweeps)
+
+    widths = [NODE_PADDING + CHAR_WIDTH * len(label) for label in labels]
+    positions = [None] * n
+    x = 0.0
+    step = NODE_HEIGHT + NODE_SEP
+    for layer in layers:
+        if not layer:
+            continue
+        w = max(widths[v] for v in layer)
+        top = -(len(layer) - 1) * step / 2
+        for i, v in enumerate(layer):
+            positions[v] = [round(x + w / 2), round(top + i * step)]
+        x += w + RANK_SEP
+    return positions